@@ -0,0 +1,147 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+# A dictionary-encoded column: codes[i] indexes into labels, and labels are
+# numbered in the order they first appear in the file
+Column = namedtuple('Column', ['codes', 'labels'])
+
+CACHE_DIR_NAME = '.columnar_cache'
+
+# array typecodes used while parsing, and the dtype they are saved as
+KINDS = {
+    'category': ('i', np.int32),
+    'float': ('d', np.float64),
+    'int': ('q', np.int64),
+}
+
+
+def cache_path(filename, key, cache_dir=None):
+    # The cache entry is tied to the file's size and mtime, so editing or
+    # replacing the CSV invalidates it, and to the parse options in key
+    stat = os.stat(filename)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    name = f"{os.path.basename(filename)}-{stat.st_size}-{stat.st_mtime_ns}-{digest}"
+    return os.path.join(cache_dir, name)
+
+def save_cache(path, arrays, labels):
+    # Written to a temporary directory first so a crashed run never leaves a
+    # half-written entry behind
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, name + '.npy'), values)
+        with open(os.path.join(tmp, 'labels.json'), 'w', encoding='utf-8') as file:
+            json.dump(labels, file, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+def load_cache(path):
+    # Arrays are memory-mapped, so loading costs no parsing and no copy
+    with open(os.path.join(path, 'labels.json'), encoding='utf-8') as file:
+        labels = json.load(file)
+    arrays = {}
+    for entry in os.listdir(path):
+        if entry.endswith('.npy'):
+            arrays[entry[:-4]] = np.load(os.path.join(path, entry), mmap_mode='r')
+    return arrays, labels
+
+
+def parse_columns(filename, columns, skip_header=True):
+    # columns maps a name to (csv column index, kind) with kind one of KINDS
+    buffers = {name: array(KINDS[kind][0]) for name, (index, kind) in columns.items()}
+    dictionaries = {name: {} for name, (index, kind) in columns.items() if kind == 'category'}
+    converters = []
+    for name, (index, kind) in columns.items():
+        if kind == 'category':
+            dictionary = dictionaries[name]
+            converter = lambda value, dictionary=dictionary: dictionary.setdefault(value, len(dictionary))
+        else:
+            converter = float if kind == 'float' else int
+        converters.append((index, converter, buffers[name].append))
+    with open(filename, 'r', newline='') as file:
+        reader = csv.reader(file)
+        if skip_header:
+            next(reader, None)
+        for row in reader:
+            for index, converter, append in converters:
+                append(converter(row[index]))
+    arrays = {name: np.frombuffer(buffers[name], dtype=KINDS[kind][1]) for name, (index, kind) in columns.items()}
+    labels = {name: list(dictionary) for name, dictionary in dictionaries.items()}
+    return arrays, labels
+
+def load_columns(filename, columns, cache_dir=None, skip_header=True):
+    # Parses the CSV the first time and serves later runs from the cache.
+    # Category columns come back as Column(codes, labels), the others as arrays.
+    path = cache_path(filename, {'columns': columns, 'skip_header': skip_header}, cache_dir)
+    if not os.path.isdir(path):
+        arrays, labels = parse_columns(filename, columns, skip_header)
+        save_cache(path, arrays, labels)
+    arrays, labels = load_cache(path)
+    return {name: Column(arrays[name], labels[name]) if name in labels else arrays[name]
+            for name in columns}
+
+
+def parse_baskets(filename, skip_header=False):
+    # One basket per row, each distinct cell an item, stored as CSR arrays:
+    # the items of basket i are items[indptr[i]:indptr[i + 1]]
+    indptr = array('q', [0])
+    items = array('i')
+    dictionary = {}
+    with open(filename, 'r', newline='') as file:
+        reader = csv.reader(file)
+        if skip_header:
+            next(reader, None)
+        for row in reader:
+            basket = {dictionary.setdefault(item, len(dictionary)) for item in row}
+            items.extend(sorted(basket))
+            indptr.append(len(items))
+    arrays = {
+        'indptr': np.frombuffer(indptr, dtype=np.int64),
+        'items': np.frombuffer(items, dtype=np.int32),
+    }
+    return arrays, {'items': list(dictionary)}
+
+def load_baskets(filename, cache_dir=None, skip_header=False):
+    path = cache_path(filename, {'baskets': True, 'skip_header': skip_header}, cache_dir)
+    if not os.path.isdir(path):
+        arrays, labels = parse_baskets(filename, skip_header)
+        save_cache(path, arrays, labels)
+    arrays, labels = load_cache(path)
+    return arrays['indptr'], Column(arrays['items'], labels['items'])
+
+def baskets_to_transactions(indptr, items):
+    labels = items.labels
+    codes = items.codes.tolist()
+    bounds = indptr.tolist()
+    return [{labels[code] for code in codes[start:end]} for start, end in zip(bounds, bounds[1:])]
+
+
+def group_sum(codes, values, num_groups):
+    return np.bincount(codes, weights=values, minlength=num_groups)
+
+def group_count(codes, num_groups):
+    return np.bincount(codes, minlength=num_groups)
+
+def top_groups(totals, k, tie_breaker=None):
+    # Indices of the k largest totals; ties go to the smaller tie_breaker value,
+    # or to the group seen first in the file when there is none
+    if tie_breaker is None:
+        order = np.argsort(-totals, kind='stable')
+    else:
+        order = np.lexsort((tie_breaker, -totals))
+    return order[:k]
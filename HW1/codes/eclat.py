@@ -0,0 +1,100 @@
+class VerticalIndex:
+    # Vertical layout of a transaction list: one bitmap per item, stored as a
+    # Python int whose bit t is set when transaction t contains the item. The
+    # support of an itemset is the popcount of the AND of its items' bitmaps.
+    # Bitmaps of itemsets passed to remember() are cached, and a new itemset
+    # starts from the longest cached prefix of its sorted items.
+    def __init__(self, transactions):
+        tid_bytes = {}
+        size = 0
+        for tid, transaction in enumerate(transactions):
+            byte, bit = tid >> 3, 1 << (tid & 7)
+            for item in set(transaction):
+                bits = tid_bytes.get(item)
+                if bits is None:
+                    bits = tid_bytes[item] = bytearray()
+                if len(bits) <= byte:
+                    bits.extend(bytes(byte + 1 - len(bits)))
+                bits[byte] |= bit
+            size = tid + 1
+        self.num_transactions = size
+        self.items = {item: int.from_bytes(bits, 'little') for item, bits in tid_bytes.items()}
+        self.cache = {}
+
+    def key(self, itemset):
+        return itemset if isinstance(itemset, tuple) else tuple(sorted(itemset))
+
+    def bitmap(self, itemset):
+        key = self.key(itemset)
+        bitmap = self.cache.get(key)
+        if bitmap is not None:
+            return bitmap
+        cut = len(key) - 1
+        while cut > 1 and key[:cut] not in self.cache:
+            cut -= 1
+        if cut > 1:
+            bitmap = self.cache[key[:cut]]
+        else:
+            bitmap, cut = self.items.get(key[0], 0), 1
+        for item in key[cut:]:
+            bitmap &= self.items.get(item, 0)
+        return bitmap
+
+    def support(self, itemset):
+        return self.bitmap(itemset).bit_count()
+
+    def remember(self, itemsets):
+        for itemset in itemsets:
+            key = self.key(itemset)
+            self.cache[key] = self.bitmap(key)
+
+    def item_support(self, item):
+        return self.items.get(item, 0).bit_count()
+
+
+def eclat(index, min_support, max_size=None):
+    # Depth-first Eclat over a VerticalIndex: each k+1 itemset's bitmap is
+    # its k-prefix's bitmap ANDed with one more item. min_support is one
+    # threshold or a {size: threshold} dict, as for fp_growth. The bitmaps of
+    # the frequent itemsets are left in index.cache for later lookups.
+    if isinstance(min_support, dict):
+        thresholds = min_support
+        if max_size is None:
+            max_size = max(thresholds)
+        largest = max_size
+        # Supersets can only be frequent if they reach the lowest threshold
+        # of any size that is still to come
+        floors = {size: min(t for s, t in thresholds.items() if s >= size) for size in range(1, largest + 1)}
+    else:
+        thresholds = None
+        floors = None
+
+    def floor(size):
+        if floors is None:
+            return min_support
+        return floors.get(size, float('inf'))
+
+    results = {}
+    items = sorted((item, bitmap) for item, bitmap in index.items.items()
+                   if bitmap.bit_count() >= floor(1))
+
+    def extend(prefix, candidates):
+        size = len(prefix) + 1
+        for i, (item, bitmap) in enumerate(candidates):
+            itemset = prefix + (item,)
+            count = bitmap.bit_count()
+            if thresholds is None or (size in thresholds and count >= thresholds[size]):
+                results[frozenset(itemset)] = count
+                index.cache[itemset] = bitmap
+            if max_size is not None and size >= max_size:
+                continue
+            extensions = []
+            for other, other_bitmap in candidates[i + 1:]:
+                joined = bitmap & other_bitmap
+                if joined.bit_count() >= floor(size + 1):
+                    extensions.append((other, joined))
+            if extensions:
+                extend(itemset, extensions)
+
+    extend((), items)
+    return results
@@ -0,0 +1,90 @@
+class FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def build_fp_tree(weighted_transactions, min_support, allowed_items=None):
+    # Pass 1 counts the items, pass 2 inserts every transaction with its
+    # frequent items in descending support order, so transactions sharing
+    # their most frequent items share a path. The header table lists the
+    # nodes of each item.
+    item_counts = {}
+    for transaction, weight in weighted_transactions:
+        for item in transaction:
+            item_counts[item] = item_counts.get(item, 0) + weight
+    frequent = {item: count for item, count in item_counts.items()
+                if count >= min_support and (allowed_items is None or item in allowed_items)}
+    rank = {item: position for position, item in
+            enumerate(sorted(frequent, key=lambda item: (-frequent[item], item)))}
+
+    root = FPNode(None, None)
+    header = {item: [] for item in frequent}
+    for transaction, weight in weighted_transactions:
+        items = sorted((item for item in transaction if item in rank), key=rank.__getitem__)
+        node = root
+        for item in items:
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = FPNode(item, node)
+                header[item].append(child)
+            child.count += weight
+            node = child
+    return header, frequent, rank
+
+def prefix_paths(nodes):
+    # Conditional pattern base of an item: the path above each of its nodes,
+    # weighted by that node's count
+    paths = []
+    for node in nodes:
+        path = []
+        parent = node.parent
+        while parent.item is not None:
+            path.append(parent.item)
+            parent = parent.parent
+        if path:
+            paths.append((path, node.count))
+    return paths
+
+def mine_tree(header, frequent, rank, suffix, min_support, max_size, results):
+    # Least frequent items first, each extending the current suffix
+    for item in sorted(frequent, key=rank.__getitem__, reverse=True):
+        itemset = suffix | {item}
+        results[itemset] = frequent[item]
+        if max_size is not None and len(itemset) >= max_size:
+            continue
+        paths = prefix_paths(header[item])
+        if not paths:
+            continue
+        conditional_header, conditional_frequent, conditional_rank = build_fp_tree(paths, min_support)
+        if conditional_frequent:
+            mine_tree(conditional_header, conditional_frequent, conditional_rank,
+                      itemset, min_support, max_size, results)
+
+def fp_growth(transactions, min_support, max_size=None, allowed_items=None):
+    # All frequent itemsets with their supports, without candidate generation.
+    # min_support is one threshold for every size or a {size: threshold}
+    # dict such as {1: 200, 2: 100, 3: 75}; with a dict, sizes above the
+    # largest key are not mined. The tree is mined at the smallest threshold
+    # and each itemset is then checked against the threshold of its size.
+    if isinstance(min_support, dict):
+        thresholds = min_support
+        if max_size is None:
+            max_size = max(thresholds)
+        mining_support = min(thresholds.values())
+    else:
+        thresholds = None
+        mining_support = min_support
+
+    header, frequent, rank = build_fp_tree([(transaction, 1) for transaction in transactions],
+                                           mining_support, allowed_items)
+    results = {}
+    mine_tree(header, frequent, rank, frozenset(), mining_support, max_size, results)
+    if thresholds is None:
+        return results
+    return {itemset: count for itemset, count in results.items()
+            if len(itemset) in thresholds and count >= thresholds[len(itemset)]}
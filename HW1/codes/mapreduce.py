@@ -0,0 +1,314 @@
+import csv
+import heapq
+import math
+import os
+import pickle
+import tempfile
+import zlib
+from collections import namedtuple
+from functools import partial
+from multiprocessing import Pool
+from operator import add, itemgetter
+
+# Number of distinct keys the map-side combiner keeps in memory before it
+# spills a sorted run of partial aggregates to disk
+DEFAULT_MAX_KEYS = 1000000
+
+# create turns a mapped value into a partial aggregate, add folds another
+# mapped value into it, merge joins two partials and finalize produces the result
+Aggregator = namedtuple('Aggregator', ['create', 'add', 'merge', 'finalize'])
+
+
+def identity(value):
+    return value
+
+def add_partial(partials, x):
+    # Shewchuk's exact summation (the algorithm behind math.fsum): partials
+    # stay non-overlapping, so the final sum does not depend on the order or
+    # grouping of the additions and the serial and parallel runs agree exactly
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+    return partials
+
+def merge_partials(partials, other):
+    for x in other:
+        add_partial(partials, x)
+    return partials
+
+def new_partials(value):
+    return [value]
+
+def one(value):
+    return 1
+
+def increment(count, value):
+    return count + 1
+
+def new_mean(value):
+    return [[value], 1]
+
+def add_mean(mean, value):
+    add_partial(mean[0], value)
+    mean[1] += 1
+    return mean
+
+def merge_mean(mean, other):
+    merge_partials(mean[0], other[0])
+    mean[1] += other[1]
+    return mean
+
+def finalize_mean(mean):
+    return math.fsum(mean[0]) / mean[1]
+
+def new_top(value):
+    return [value]
+
+def add_top(k, top, value):
+    # top is a min-heap of the k largest values seen so far
+    if len(top) < k:
+        heapq.heappush(top, value)
+    elif value > top[0]:
+        heapq.heapreplace(top, value)
+    return top
+
+def merge_top(k, top, other):
+    for value in other:
+        add_top(k, top, value)
+    return top
+
+def finalize_top(top):
+    return sorted(top, reverse=True)
+
+# Aggregators are shipped to worker processes, so they are built from
+# module-level functions rather than lambdas
+SUM = Aggregator(new_partials, add_partial, merge_partials, math.fsum)
+COUNT = Aggregator(one, increment, add, identity)
+MEAN = Aggregator(new_mean, add_mean, merge_mean, finalize_mean)
+MIN = Aggregator(identity, min, min, identity)
+MAX = Aggregator(identity, max, max, identity)
+
+def TOP_K(k):
+    return Aggregator(new_top, partial(add_top, k), partial(merge_top, k), finalize_top)
+
+def as_aggregator(combine):
+    if isinstance(combine, Aggregator):
+        return combine
+    return Aggregator(identity, combine, combine, identity)
+
+
+def read_rows(filename, skip_header=True):
+    with open(filename, 'r', newline='') as file:
+        reader = csv.reader(file)
+        if skip_header:
+            next(reader, None)
+        for row in reader:
+            yield tuple(row)
+
+def map_rows(rows, map_function):
+    for row in rows:
+        yield from map_function(row)
+
+def write_run(items, spill_dir=None):
+    with tempfile.NamedTemporaryFile('wb', suffix='.run', dir=spill_dir, delete=False) as file:
+        for item in items:
+            pickle.dump(item, file, pickle.HIGHEST_PROTOCOL)
+    return file.name
+
+def read_run(path):
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+def merge_runs(runs, merge):
+    # Runs are sorted by key, so equal keys come out of the merge next to each
+    # other. heapq.merge is stable, so the partials of a key are merged in the
+    # order they were spilled and the smallest sequence number comes first.
+    current = None
+    for key, seq, value in heapq.merge(*runs, key=itemgetter(0)):
+        if current is not None and current[0] == key:
+            current[2] = merge(current[2], value)
+        else:
+            if current is not None:
+                yield tuple(current)
+            current = [key, seq, value]
+    if current is not None:
+        yield tuple(current)
+
+def combine_pairs(pairs, aggregator, max_keys=DEFAULT_MAX_KEYS, spill_dir=None):
+    # Map-side combine: every key holds one partial aggregate together with the
+    # position of its first pair, so the output keeps first-seen order.
+    # Returns {key: [seq, partial]}.
+    create, fold, merge = aggregator.create, aggregator.add, aggregator.merge
+    table = {}
+    run_paths = []
+    try:
+        for seq, (key, value) in enumerate(pairs):
+            entry = table.get(key)
+            if entry is not None:
+                entry[1] = fold(entry[1], value)
+                continue
+            if len(table) >= max_keys:
+                run_paths.append(write_run(((k, s, v) for k, (s, v) in sorted(table.items())), spill_dir))
+                table = {}
+            table[key] = [seq, create(value)]
+
+        if not run_paths:
+            return table
+
+        in_memory = [(key, seq, value) for key, (seq, value) in sorted(table.items())]
+        table = None
+        runs = [read_run(path) for path in run_paths] + [iter(in_memory)]
+        merged = sorted(merge_runs(runs, merge), key=itemgetter(1))
+        return {key: [seq, value] for key, seq, value in merged}
+    finally:
+        for path in run_paths:
+            os.remove(path)
+
+def finalize_table(table, aggregator):
+    finalize = aggregator.finalize
+    return {key: finalize(value) for key, (seq, value) in table.items()}
+
+
+def split_file(filename, num_chunks):
+    size = os.path.getsize(filename)
+    step = max(1, -(-size // num_chunks))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+def read_chunk_lines(filename, start, end):
+    # A line belongs to the chunk that holds its first byte
+    with open(filename, 'rb') as file:
+        if start > 0:
+            file.seek(start - 1)
+            file.readline()
+        position = file.tell()
+        for line in file:
+            if position >= end:
+                return
+            position += len(line)
+            yield line.decode('utf-8')
+
+def read_chunk_rows(filename, start, end, skip_header=True):
+    lines = read_chunk_lines(filename, start, end)
+    if skip_header and start == 0:
+        next(lines, None)
+    for row in csv.reader(lines):
+        yield tuple(row)
+
+def partition_of(key, num_partitions):
+    # hash() of a str is salted per process, so use a stable hash for the shuffle
+    return zlib.crc32(repr(key).encode('utf-8')) % num_partitions
+
+def map_chunk(task):
+    filename, index, start, end, map_function, aggregator, num_partitions, max_keys, spill_dir = task
+    pairs = map_rows(read_chunk_rows(filename, start, end), map_function)
+    table = combine_pairs(pairs, aggregator, max_keys, spill_dir)
+    partitions = [{} for _ in range(num_partitions)]
+    for key, (seq, value) in table.items():
+        partitions[partition_of(key, num_partitions)][key] = [(index, seq), value]
+    return partitions
+
+def reduce_partition(task):
+    tables, aggregator = task
+    merge = aggregator.merge
+    merged = {}
+    # Chunk tables arrive in file order, so the first entry of a key holds its
+    # global first-seen position
+    for table in tables:
+        for key, (seq, value) in table.items():
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [seq, value]
+            else:
+                entry[1] = merge(entry[1], value)
+    finalize = aggregator.finalize
+    return [(seq, key, finalize(value)) for key, (seq, value) in merged.items()]
+
+def run_job_parallel(filename, map_function, aggregator, workers, chunks_per_worker=4,
+                     max_keys=DEFAULT_MAX_KEYS, spill_dir=None):
+    chunks = split_file(filename, workers * chunks_per_worker)
+    tasks = [(filename, index, start, end, map_function, aggregator, workers, max_keys, spill_dir)
+             for index, (start, end) in enumerate(chunks)]
+    with Pool(workers) as pool:
+        mapped = pool.map(map_chunk, tasks)
+        shuffled = [([partitions[p] for partitions in mapped], aggregator) for p in range(workers)]
+        mapped = None
+        reduced = pool.map(reduce_partition, shuffled)
+    results = sorted((item for partition in reduced for item in partition), key=itemgetter(0))
+    return {key: value for seq, key, value in results}
+
+# Streams the file through map_function and aggregates the emitted (key, value)
+# pairs. combine is an Aggregator such as SUM or COUNT, or a plain associative
+# function like operator.add. Memory is bounded by the number of distinct keys,
+# not the number of rows. With workers > 1 the file is split into byte ranges
+# that are mapped and combined in a process pool, hash-partitioned by key and
+# reduced in parallel; the result is identical to the serial run.
+def run_job(filename, map_function, combine, max_keys=DEFAULT_MAX_KEYS, spill_dir=None, workers=1):
+    aggregator = as_aggregator(combine)
+    if workers > 1:
+        return run_job_parallel(filename, map_function, aggregator, workers,
+                                max_keys=max_keys, spill_dir=spill_dir)
+    pairs = map_rows(read_rows(filename), map_function)
+    return finalize_table(combine_pairs(pairs, aggregator, max_keys, spill_dir), aggregator)
+
+
+class QueryMapper:
+    # Runs the map function of every query on a row and tags each pair with the
+    # query index, so one pass over the file feeds all of them
+    def __init__(self, map_functions):
+        self.map_functions = map_functions
+
+    def __call__(self, row):
+        for index, map_function in enumerate(self.map_functions):
+            for key, value in map_function(row):
+                yield (index, key), (index, value)
+
+
+class QueryAggregator:
+    # Dispatches each tagged value to the aggregator of its query; the state
+    # of a key is [query index, partial of that query's aggregator]
+    def __init__(self, aggregators):
+        self.aggregators = aggregators
+
+    def create(self, tagged):
+        index, value = tagged
+        return [index, self.aggregators[index].create(value)]
+
+    def add(self, state, tagged):
+        state[1] = self.aggregators[state[0]].add(state[1], tagged[1])
+        return state
+
+    def merge(self, state, other):
+        state[1] = self.aggregators[state[0]].merge(state[1], other[1])
+        return state
+
+    def finalize(self, state):
+        return self.aggregators[state[0]].finalize(state[1])
+
+    def as_aggregator(self):
+        return Aggregator(self.create, self.add, self.merge, self.finalize)
+
+
+# Evaluates several keyed aggregations in one streaming pass. queries maps a
+# name to (map_function, aggregator); the result maps each name to the same
+# dict run_job would have returned for that query alone.
+def run_queries(filename, queries, max_keys=DEFAULT_MAX_KEYS, spill_dir=None, workers=1):
+    names = list(queries)
+    mapper = QueryMapper([queries[name][0] for name in names])
+    aggregator = QueryAggregator([as_aggregator(queries[name][1]) for name in names]).as_aggregator()
+    results = {name: {} for name in names}
+    combined = run_job(filename, mapper, aggregator, max_keys, spill_dir, workers)
+    for (index, key), value in combined.items():
+        results[names[index]][key] = value
+    return results
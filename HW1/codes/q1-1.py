@@ -1,11 +1,8 @@
-import csv
+import argparse
+from functools import partial
 
-def read_data(filename):
-    with open(filename, 'r', newline='') as file:
-        reader = csv.reader(file)
-        next(reader)
-        data = [tuple(row) for row in reader]
-    return data
+from mapreduce import SUM, combine_pairs, finalize_table, map_rows, read_rows, run_queries
+from topk import SpaceSaving, by_count, top_k
 
 def map_function(data, question_part):
     customer_id = data[0]
@@ -16,63 +13,79 @@ def map_function(data, question_part):
     else:
         return [(customer_id, purchase_amount)]
 
-def group_by(data):
-    grouped_data = {}
-    for key, value in data:
-        if key not in grouped_data:
-            grouped_data[key] = []
-        grouped_data[key].append(value)
-    return grouped_data.items()
-
-def reduce_function(grouped_data):
-    reduced_data = {}
-    for key, values in grouped_data:
-        total = sum(values)
-        reduced_data[key] = total
-    return reduced_data
-
-
-# Read data from CSV file
-input_data = read_data("purchase_records.csv")
-
-
-# Part a
-mapped_data_a = []
-for entry in input_data:
-    mapped_data_a.extend(map_function(entry, 'a'))
-# print("\nData after Map Function: (for part a)")
-# print(mapped_data_a[:10])
-
-grouped_data_a = group_by(mapped_data_a)
-# print("\nData after Group-By Function: (for part a)")
-# print(grouped_data_a)
-
-reduced_data_a = reduce_function(grouped_data_a)
-
-# Print final result for part a
-# Total revenue generated by each product category during the whole dataset period
-for product_category, total_revenue in reduced_data_a.items():
-    print("\nProduct Category:", product_category)
-    print("Total Revenue:", total_revenue)
-
-print('\n')
-
-# Part b
-mapped_data_b = []
-for entry in input_data:
-    mapped_data_b.extend(map_function(entry, 'b'))
-# print("\nData after Map Function: (for part b)")
-# print(mapped_data_b[:10])
-
-grouped_data_b = group_by(mapped_data_b)
-# print("\nData after Group-By Function: (for part b)")
-# print(grouped_data_b)
-
-reduced_data_b = reduce_function(grouped_data_b)
-
-# Print final result for part b
-# The most 10 popular customers in terms of their purchase volume
-sorted_customers = sorted(reduced_data_b.items(), key=lambda x: x[1], reverse=True)
-print("Top 10 Customers by Purchase Volume:")
-for i, (customer_id, purchase_volume) in enumerate(sorted_customers[:10], 1):
-    print(f"{i}. Customer ID: {customer_id}, Purchase Volume: ${purchase_volume}")
\ No newline at end of file
+def feed_sketch(rows, sketch):
+    # Passes the rows through unchanged, adding each customer's amount to
+    # the sketch on the way, so part a and the sketch share one read
+    for entry in rows:
+        for customer_id, purchase_amount in map_function(entry, 'b'):
+            sketch.update(customer_id, purchase_amount)
+        yield entry
+
+def columnar_reports(filename):
+    # Typed columns are parsed once and memory-mapped from the cache on later
+    # runs; both parts are then a vectorised group-by over the codes
+    from columnar import group_sum, load_columns, top_groups
+    columns = load_columns(filename, {
+        'customer_id': (0, 'category'),
+        'product_category': (1, 'category'),
+        'purchase_amount': (2, 'float'),
+    })
+    categories = columns['product_category']
+    customers = columns['customer_id']
+    amounts = columns['purchase_amount']
+    revenue = group_sum(categories.codes, amounts, len(categories.labels))
+    volume = group_sum(customers.codes, amounts, len(customers.labels))
+    reduced_data_a = dict(zip(categories.labels, revenue.tolist()))
+    sorted_customers = [(customers.labels[i], volume[i].item()) for i in top_groups(volume, 10)]
+    return reduced_data_a, sorted_customers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file", nargs="?", default="purchase_records.csv")
+    parser.add_argument("--workers", type=int, default=1, help="processes to map and reduce with")
+    parser.add_argument("--approximate", type=int, metavar="CAPACITY",
+                        help="find the top customers with a Space-Saving sketch of CAPACITY counters")
+    parser.add_argument("--columnar", action="store_true",
+                        help="aggregate cached typed columns with NumPy instead of streaming the CSV")
+    args = parser.parse_args()
+
+    sketch = None
+    if args.columnar:
+        reduced_data_a, sorted_customers = columnar_reports(args.input_file)
+    elif args.approximate is None:
+        # Both parts are answered from a single streaming pass over the CSV,
+        # with the amounts summed per key on the map side
+        queries = {
+            'a': (partial(map_function, question_part='a'), SUM),
+            'b': (partial(map_function, question_part='b'), SUM),
+        }
+        reduced_data = run_queries(args.input_file, queries, workers=args.workers)
+        reduced_data_a = reduced_data['a']
+        reduced_data_b = reduced_data['b']
+        sorted_customers = top_k(reduced_data_b.items(), 10, key=by_count)
+    else:
+        # Fixed memory whatever the number of customers. The sketch is fed
+        # in order from the same pass that sums part a, so this path reads
+        # the file once and serially
+        sketch = SpaceSaving(args.approximate)
+        rows = feed_sketch(read_rows(args.input_file), sketch)
+        pairs = map_rows(rows, partial(map_function, question_part='a'))
+        reduced_data_a = finalize_table(combine_pairs(pairs, SUM), SUM)
+        sorted_customers = [(customer_id, volume) for customer_id, volume, error in sketch.top(10)]
+
+    # Print final result for part a
+    # Total revenue generated by each product category during the whole dataset period
+    for product_category, total_revenue in reduced_data_a.items():
+        print("\nProduct Category:", product_category)
+        print("Total Revenue:", total_revenue)
+
+    print('\n')
+
+    # Print final result for part b
+    # The most 10 popular customers in terms of their purchase volume
+    if sketch is not None:
+        print(f"Approximate: each volume is at most ${sketch.error_bound()} above the true one")
+    print("Top 10 Customers by Purchase Volume:")
+    for i, (customer_id, purchase_volume) in enumerate(sorted_customers, 1):
+        print(f"{i}. Customer ID: {customer_id}, Purchase Volume: ${purchase_volume}")
\ No newline at end of file
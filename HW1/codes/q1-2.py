@@ -1,51 +1,49 @@
-import csv
+import argparse
 
-def read_data(filename):
-    with open(filename, 'r', newline='') as file:
-        reader = csv.reader(file)
-        next(reader)
-        data = [tuple(row) for row in reader]
-    return data
+from mapreduce import COUNT, read_rows, run_job
+from topk import SpaceSaving, top_k
 
 def map_function(input):
     product_category = input[0]
     action = input[2]  
     return [(product_category, action)]
 
-def group_by(data):
-    grouped_data = {}
-    for key, value in data:
-        if key not in grouped_data:
-            grouped_data[key] = []
-        grouped_data[key].append(value)
-    return grouped_data.items()
-
-def reduce_function(grouped_data):
-    results = {}
-    for key, values in grouped_data:
-        count = len(values)
-        results[key] = count
-    return results
-
-
-input_data = read_data("social_media_dataset.csv")
-
-mapped_data = []
-for entry in input_data:
-    mapped_data.extend(map_function(entry))
-# print("\nData after Map Function:")
-# print(mapped_data[:10])
-
-grouped_data = group_by(mapped_data)
-# print("\nData after Group-By Function:")
-# print(grouped_data)
-
-reduced_data = reduce_function(grouped_data)
-
-# sorted_data = sorted(reduced_data.items(), key=lambda x: x[1], reverse=True)
-sorted_data = sorted(reduced_data.items(), key=lambda x: (-x[1], -int(x[0])))
-
-
-print("Top 10 users:")
-for i, (user_id, action_type) in enumerate(sorted_data[:10], 1):
-    print(f"{i}. User ID: {user_id}, Number of actions: {action_type}")
\ No newline at end of file
+def columnar_top_users(filename):
+    # Counts per user are a bincount over the cached, dictionary-encoded ids
+    from columnar import group_count, load_columns, top_groups
+    users = load_columns(filename, {'user_id': (0, 'category')})['user_id']
+    counts = group_count(users.codes, len(users.labels))
+    user_ids = [-int(user_id) for user_id in users.labels]
+    return [(users.labels[i], counts[i].item()) for i in top_groups(counts, 10, tie_breaker=user_ids)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file", nargs="?", default="social_media_dataset.csv")
+    parser.add_argument("--workers", type=int, default=1, help="processes to map and reduce with")
+    parser.add_argument("--approximate", type=int, metavar="CAPACITY",
+                        help="find the top users with a Space-Saving sketch of CAPACITY counters")
+    parser.add_argument("--columnar", action="store_true",
+                        help="count over cached typed columns with NumPy instead of streaming the CSV")
+    args = parser.parse_args()
+
+    if args.columnar:
+        sorted_data = columnar_top_users(args.input_file)
+    elif args.approximate is None:
+        reduced_data = run_job(args.input_file, map_function, COUNT, workers=args.workers)
+
+        # sorted_data = sorted(reduced_data.items(), key=lambda x: x[1], reverse=True)
+        sorted_data = top_k(reduced_data.items(), 10, key=lambda x: (-x[1], -int(x[0])))
+    else:
+        # Fixed memory whatever the number of users
+        sketch = SpaceSaving(args.approximate)
+        for entry in read_rows(args.input_file):
+            for user_id, action in map_function(entry):
+                sketch.update(user_id)
+        sorted_data = [(user_id, count) for user_id, count, error in sketch.top(10, key=lambda x: (-x[1], -int(x[0])))]
+        print(f"Approximate: each count is at most {sketch.error_bound()} above the true one")
+
+
+    print("Top 10 users:")
+    for i, (user_id, action_type) in enumerate(sorted_data, 1):
+        print(f"{i}. User ID: {user_id}, Number of actions: {action_type}")
\ No newline at end of file
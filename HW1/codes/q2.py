@@ -1,4 +1,14 @@
+import argparse
 import csv
+from functools import partial
+
+import numpy as np
+
+from columnar import baskets_to_transactions, load_baskets
+from eclat import VerticalIndex, eclat
+from fpgrowth import fp_growth
+from son import count_itemsets, son_frequent_itemsets
+from stages import NULL_PROFILER
 
 def read_data(filename):
     with open(filename, 'r') as file:
@@ -16,41 +26,120 @@ def preprocess_data(data):
     return transactions
 
 def generate_candidate_itemsets(itemsets, k):
+    # Apriori-gen: (k-1)-itemsets are joined only with those sharing their
+    # first k-2 items in sorted order, and a candidate is kept only if all of
+    # its (k-1)-subsets are frequent (downward closure)
+    frequent = set()
+    prefixes = {}
+    for itemset in itemsets:
+        if len(itemset) == k - 1:
+            frequent.add(itemset)
+            items = tuple(sorted(itemset))
+            prefixes.setdefault(items[:-1], []).append(items[-1])
     candidates = set()
-    for itemset1 in itemsets:
-        for itemset2 in itemsets:
-            union = itemset1.union(itemset2)
-            if len(union) == k and len(itemset1.intersection(itemset2)) == k - 2:
-                candidates.add(union)
+    for prefix, last_items in prefixes.items():
+        last_items.sort()
+        for i, item1 in enumerate(last_items):
+            for item2 in last_items[i + 1:]:
+                candidate = prefix + (item1, item2)
+                # The two subsets dropping item1 or item2 are the joined itemsets
+                if all(frozenset(candidate[:j] + candidate[j + 1:]) in frequent for j in range(k - 2)):
+                    candidates.add(frozenset(candidate))
     return candidates
 
-def generate_frequent_itemsets(transactions, min_support):
+def build_candidate_trie(candidates):
+    # Prefix tree over the sorted candidates; the leaf at depth k holds the
+    # candidate's index into the counts list
+    root = {}
+    keys = []
+    for candidate in candidates:
+        node = root
+        items = sorted(candidate)
+        for item in items[:-1]:
+            node = node.setdefault(item, {})
+        node[items[-1]] = len(keys)
+        keys.append(candidate)
+    return root, keys
+
+def count_subsets(node, items, start, remaining, counts):
+    # Walks only the k-subsets of the transaction that are paths in the trie
+    for i in range(start, len(items) - remaining + 1):
+        child = node.get(items[i])
+        if child is None:
+            continue
+        if remaining == 1:
+            counts[child] += 1
+        else:
+            count_subsets(child, items, i + 1, remaining - 1, counts)
+
+def count_candidates(transactions, candidates):
+    # Support of every candidate in one scan; a transaction costs roughly the
+    # number of its subsets that are candidates instead of one issubset call
+    # per candidate
+    if not candidates:
+        return {}
+    k = len(next(iter(candidates)))
+    root, keys = build_candidate_trie(candidates)
+    candidate_items = set().union(*candidates)
+    counts = [0] * len(keys)
+    for transaction in transactions:
+        items = sorted(item for item in transaction if item in candidate_items)
+        if len(items) >= k:
+            count_subsets(root, items, 0, k, counts)
+    return {candidate: count for candidate, count in zip(keys, counts) if count}
+
+def count_items(transactions):
+    # Number of transactions and the support of every item, in one scan
+    num_transactions = 0
     item_counts = {}
     for transaction in transactions:
+        num_transactions += 1
         for item in transaction:
-            if item in item_counts:
-                item_counts[item] += 1
-            else:
-                item_counts[item] = 1
-        frequent_items = {item: count for item, count in item_counts.items() if count >= min_support}
+            item_counts[item] = item_counts.get(item, 0) + 1
+    return num_transactions, item_counts
+
+def generate_frequent_itemsets(transactions, min_support, backend='apriori', return_items=False,
+                               profiler=NULL_PROFILER):
+    # With return_items, also returns the number of transactions and the
+    # support of every item, frequent or not, as the first Apriori level (or
+    # the Eclat index) counted them. The Apriori levels report their
+    # candidate-gen and count stages to profiler.
+    if backend in ('fpgrowth', 'eclat'):
+        if backend == 'fpgrowth':
+            frequent_itemsets = fp_growth(transactions, min_support)
+            if return_items:
+                num_transactions, item_counts = count_items(transactions)
+        else:
+            index = VerticalIndex(transactions)
+            frequent_itemsets = eclat(index, min_support)
+            num_transactions = index.num_transactions
+            item_counts = {item: bitmap.bit_count() for item, bitmap in index.items.items()}
+        # Level by level, like the Apriori loop, so ties are reported alike
+        frequent_itemsets = dict(sorted(frequent_itemsets.items(), key=lambda x: len(x[0])))
+        if return_items:
+            return frequent_itemsets, num_transactions, item_counts
+        return frequent_itemsets
+    with profiler.stage('count'):
+        num_transactions, item_counts = count_items(transactions)
+    profiler.count('count', num_transactions)
+    frequent_items = {item: count for item, count in item_counts.items() if count >= min_support}
     frequent_itemsets = {frozenset([item]): count for item, count in frequent_items.items()}
     k = 2
+    frequent_itemsets_k = frequent_itemsets
     while True:
-        candidates = generate_candidate_itemsets(frequent_itemsets.keys(), k)
-        frequent_itemsets_k = {}
-        for transaction in transactions:
-            for candidate in candidates:
-                if candidate.issubset(transaction):
-                    if candidate in frequent_itemsets_k:
-                        frequent_itemsets_k[candidate] += 1
-                    else:
-                        frequent_itemsets_k[candidate] = 1
+        with profiler.stage('candidate-gen'):
+            candidates = generate_candidate_itemsets(frequent_itemsets_k.keys(), k)
+        profiler.count('candidate-gen', len(candidates))
+        with profiler.stage('count', num_transactions):
+            frequent_itemsets_k = count_candidates(transactions, candidates)
         frequent_itemsets_k = {itemset: count for itemset, count in frequent_itemsets_k.items() if count >= min_support}
         if not frequent_itemsets_k:
             break
         frequent_itemsets.update(frequent_itemsets_k)
         k += 1
     
+    if return_items:
+        return frequent_itemsets, num_transactions, item_counts
     return frequent_itemsets
 
 def generate_pairs(frequent_itemsets):
@@ -61,152 +150,155 @@ def generate_pairs(frequent_itemsets):
     return pairs
 
 def generate_frequent_pairs(transactions, frequent_itemsets, min_support):
+    # The supports of the pairs were already counted while mining
+    # frequent_itemsets, so there is no need to scan the transactions again
     pairs = generate_pairs(frequent_itemsets)
     frequent_pairs = {}
     for pair in pairs:
-        count = 0
-        for transaction in transactions:
-            if pair.issubset(transaction):
-                count += 1
+        count = frequent_itemsets[pair]
         if count >= min_support:
             frequent_pairs[pair] = count
     return frequent_pairs
 
 def generate_triples(frequent_pairs):
+    # Every triple covered by two frequent pairs that share an item, found by
+    # joining the neighbours of each item instead of comparing all pairs.
+    # No subset pruning here: min_support_triples is lower than the pairs'
+    # threshold, so a frequent triple may contain an infrequent pair.
+    neighbours = {}
+    for pair in frequent_pairs:
+        item1, item2 = pair
+        neighbours.setdefault(item1, set()).add(item2)
+        neighbours.setdefault(item2, set()).add(item1)
     triples = set()
-    for pair1 in frequent_pairs:
-        for pair2 in frequent_pairs:
-            if pair1 != pair2 and pair1.intersection(pair2):
-                triple = pair1.union(pair2)
-                if len(triple) == 3:
-                    triples.add(triple)
+    for item, others in neighbours.items():
+        others = sorted(others)
+        for i, item1 in enumerate(others):
+            for item2 in others[i + 1:]:
+                triples.add(frozenset([item, item1, item2]))
     return triples
 
-def generate_frequent_triples(transactions, frequent_pairs, min_support):
-    triples = generate_triples(frequent_pairs)
+def generate_frequent_triples(transactions, frequent_pairs, min_support, backend='apriori', profiler=NULL_PROFILER):
+    with profiler.stage('candidate-gen'):
+        triples = generate_triples(frequent_pairs)
+    profiler.count('candidate-gen', len(triples))
+    if backend == 'fpgrowth':
+        # Mine every triple over the items of the pairs, then keep the candidates
+        pair_items = set().union(*frequent_pairs) if frequent_pairs else set()
+        counts = fp_growth(transactions, {3: min_support}, allowed_items=pair_items)
+        return {triple: counts[triple] for triple in triples if triple in counts}
+    if backend == 'eclat':
+        # Word-parallel AND of the item bitmaps; the pair bitmaps are cached
+        # so every triple costs one more AND and a popcount
+        index = VerticalIndex(transactions)
+        index.remember(frequent_pairs)
+        supports = ((triple, index.support(triple)) for triple in triples)
+        return {triple: count for triple, count in supports if count >= min_support}
     frequent_triples = {}
-    for triple in triples:
-        count = 0
-        for transaction in transactions:
-            if triple.issubset(transaction):
-                count += 1
+    with profiler.stage('count', len(transactions)):
+        counts = count_candidates(transactions, triples)
+    for triple, count in counts.items():
         if count >= min_support:
             frequent_triples[triple] = count
     return frequent_triples
 
-def confidence_based_top_rules(frequent_triples, frequent_itemsets):
-    rules = []
-    for triple, support in frequent_triples.items():
-        A, B, C = triple
-        AB = frozenset([A, B])
-        AC = frozenset([A, C])
-        BC = frozenset([B, C])
-        try:
-            confidence_AB_C = support / frequent_itemsets[AB]
-        except KeyError:
-            confidence_AB_C = 0
-        try:
-            confidence_AC_B = support / frequent_itemsets[AC]
-        except KeyError:
-            confidence_AC_B = 0
-        try:
-            confidence_BC_A = support / frequent_itemsets[BC]
-        except KeyError:
-            confidence_BC_A = 0
-        
-        # Append rules
-        rules.append(((A, B), C, confidence_AB_C))
-        rules.append(((A, C), B, confidence_AC_B))
-        rules.append(((B, C), A, confidence_BC_A))
-    
-    # Sort rules based on confidence
-    sorted_rules = sorted(rules, key=lambda x: x[2], reverse=True)
-    return sorted_rules[:5]
+class SupportIndex:
+    # Support of every single item (frequent or not) plus every itemset mined
+    # so far, for O(1) lookups while scoring rules. Built from the counts the
+    # miner returns, so it costs no scan of its own. Lookups of an unknown
+    # itemset raise KeyError like the frequent_itemsets dict did.
+    def __init__(self, total_transactions, item_counts):
+        self.total_transactions = total_transactions
+        self.item_counts = item_counts
+        self.itemsets = {}
 
-def interest_based_top_rules(triples, frequent_itemsets, total_transactions):
-    rules = []
-    for triple, support in triples.items():
-        A, B, C = triple
-        AB = frozenset([A, B])
-        AC = frozenset([A, C])
-        BC = frozenset([B, C])
-        try:
-            confidence_AB_C = support / frequent_itemsets[AB]
-        except KeyError:
-            confidence_AB_C = 0
-        try:
-            confidence_AC_B = support / frequent_itemsets[AC]
-        except KeyError:
-            confidence_AC_B = 0
-        try:
-            confidence_BC_A = support / frequent_itemsets[BC]
-        except KeyError:
-            confidence_BC_A = 0
-        
-        transactions_with_C = sum(1 for transaction in transactions if C in transaction)
-        transactions_with_B = sum(1 for transaction in transactions if B in transaction)
-        transactions_with_A = sum(1 for transaction in transactions if A in transaction)
-        
-        interest_AB_C = confidence_AB_C - (transactions_with_C / total_transactions)
-        interest_AC_B = confidence_AC_B - (transactions_with_B / total_transactions)
-        interest_BC_A = confidence_BC_A - (transactions_with_A / total_transactions)
-        
-        # Append rules
-        rules.append(((A, B), C, interest_AB_C))
-        rules.append(((A, C), B, interest_AC_B))
-        rules.append(((B, C), A, interest_BC_A))
-    
-    # Sort rules based on interest score
-    sorted_rules = sorted(rules, key=lambda x: x[2], reverse=True)
-    return sorted_rules[:5]
+    def update(self, itemsets):
+        self.itemsets.update(itemsets)
 
-def lift_based_top_rules(frequent_triples, frequent_itemsets):
-    rules = []
-    for triple, support in frequent_triples.items():
-        A, B, C = triple
-        AB = frozenset([A, B])
-        AC = frozenset([A, C])
-        BC = frozenset([B, C])
-        Ap = frozenset([A])
-        Bp = frozenset([B])
-        Cp = frozenset([C])
-        
-        try:
-            lift_AB_C = support  / (frequent_itemsets[AB] * frequent_itemsets[Cp])
-        except KeyError:
-            lift_AB_C = 0
-        try:
-            lift_AC_B = support  / (frequent_itemsets[AC] * frequent_itemsets[Bp])
-        except KeyError:
-            lift_AC_B = 0
+    def __getitem__(self, itemset):
+        if len(itemset) == 1:
+            (item,) = itemset
+            if item in self.item_counts:
+                return self.item_counts[item]
+        return self.itemsets[itemset]
+
+    def get(self, itemset, default=None):
         try:
-            lift_BC_A = support  / (frequent_itemsets[BC] * frequent_itemsets[Ap])
+            return self[itemset]
         except KeyError:
-            lift_BC_A = 0
-        
-        # Append rules
-        rules.append(((A, B), C, lift_AB_C))
-        rules.append(((A, C), B, lift_AC_B))
-        rules.append(((B, C), A, lift_BC_A))
-    
-    # Sort rules based on lift score
-    sorted_rules = sorted(rules, key=lambda x: x[2], reverse=True)
-    return sorted_rules[:5]
+            return default
+
+RULE_METRICS = ['confidence', 'interest', 'lift', 'leverage', 'conviction']
+
+def score_rules(frequent_triples, support_index, top_n=5, profiler=NULL_PROFILER):
+    # The three rules of each triple (AB -> C, AC -> B, BC -> A) are laid out
+    # as arrays of supports, every metric is computed for all of them at
+    # once, and a stable sort keeps the top_n per metric, so ties keep the
+    # order the rules were generated in. A support missing from the index
+    # counts as 0.
+    with profiler.stage('rule-score', 3 * len(frequent_triples)):
+        rules = []
+        supports = []
+        for triple, support in frequent_triples.items():
+            A, B, C = triple
+            rules.extend((((A, B), C), ((A, C), B), ((B, C), A)))
+            supports.extend((support, support, support))
+        total = support_index.total_transactions
+        support = np.asarray(supports, dtype=np.float64)
+        antecedent_support = np.fromiter((support_index.get(frozenset(antecedent)) or 0 for antecedent, _ in rules),
+                                         dtype=np.float64, count=len(rules))
+        consequent_support = np.fromiter((support_index.get(frozenset([consequent])) or 0 for _, consequent in rules),
+                                         dtype=np.float64, count=len(rules))
+        consequent_probability = consequent_support / total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = np.where(antecedent_support > 0, support / antecedent_support, 0.0)
+            scores = {
+                'confidence': confidence,
+                'interest': confidence - consequent_probability,
+                # Kept as in the original report: raw counts, not probabilities
+                'lift': np.where((antecedent_support > 0) & (consequent_support > 0),
+                                 support / (antecedent_support * consequent_support), 0.0),
+                'leverage': support / total - antecedent_support / total * consequent_probability,
+                'conviction': np.where(confidence < 1, (1 - consequent_probability) / (1 - confidence), np.inf),
+            }
+        top_rules = {}
+        for metric in RULE_METRICS:
+            score = scores[metric]
+            order = np.argsort(-score, kind='stable')[:top_n]
+            top_rules[metric] = [(*rules[i], score[i].item()) for i in order.tolist()]
+        return top_rules
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["apriori", "fpgrowth", "eclat"], default="apriori",
+                        help="algorithm used to mine the frequent itemsets")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="with more than one, mine store.csv in chunks with SON on this many processes")
+    args = parser.parse_args()
+
     min_support_items = 200
     min_support_pairs = 100
     min_support_triples = 75
     
-    # Read the dataset
-    data = read_data("store.csv")
-    
-    # Preprocess the data
-    transactions = preprocess_data(data)
-    
-    # Generate frequent itemsets
-    frequent_itemsets = generate_frequent_itemsets(transactions, min_support_items)
+    if args.workers > 1:
+        # SON: chunks of store.csv are mined and then counted on the pool,
+        # straight from the file, so the baskets are never all in memory
+        transactions = None
+        mine = partial(generate_frequent_itemsets, backend=args.backend)
+        frequent_itemsets, total_transactions, item_counts = son_frequent_itemsets(
+            "store.csv", min_support_items, workers=args.workers, mine=mine, return_items=True)
+    else:
+        # Read the dataset
+        # The baskets are parsed once and memory-mapped from the columnar cache on later runs
+        indptr, items = load_baskets("store.csv")
+        
+        # Preprocess the data
+        transactions = baskets_to_transactions(indptr, items)
+        
+        # Generate frequent itemsets
+        frequent_itemsets, total_transactions, item_counts = generate_frequent_itemsets(
+            transactions, min_support_items, backend=args.backend, return_items=True)
     
     # Sort and print the 10 most frequent items
     sorted_frequent_items = sorted(frequent_itemsets.items(), key=lambda x: x[1], reverse=True)[:10]
@@ -224,7 +316,12 @@ if __name__ == "__main__":
         print(f"{set(pair)}: {support}")
     
     # Generate frequent triples
-    frequent_triples = generate_frequent_triples(transactions, frequent_pairs, min_support_triples)
+    if args.workers > 1:
+        # The candidate triples are counted exactly in one parallel pass
+        triple_counts = count_itemsets("store.csv", generate_triples(frequent_pairs), workers=args.workers)
+        frequent_triples = {triple: count for triple, count in triple_counts.items() if count >= min_support_triples}
+    else:
+        frequent_triples = generate_frequent_triples(transactions, frequent_pairs, min_support_triples, backend=args.backend)
     
     # Sort and print the 10 most frequent triples of items
     sorted_frequent_triples = sorted(frequent_triples.items(), key=lambda x: x[1], reverse=True)[:10]
@@ -232,30 +329,19 @@ if __name__ == "__main__":
     for triple, support in sorted_frequent_triples:
         print(f"{set(triple)}: {support}")
 
-    # Generate association rules based on confidence
-    top_5_rules = confidence_based_top_rules(frequent_triples, frequent_itemsets)
-    print('\n')
-    print("Top 5 association rules based on confidence:")
-    for rule in top_5_rules:
-        antecedent, consequent, confidence = rule
-        print(f"{antecedent} -> {consequent}: {confidence}")
-
-    # Generate association rules based on interest
-    total_transactions = len(transactions)
-    top_5_rules_interest_new = interest_based_top_rules(frequent_triples, frequent_itemsets, total_transactions)
-    print('\n')
-    print("Top 5 association rules based on interest:")
-    for rule in top_5_rules_interest_new:
-        antecedent, consequent, interest = rule
-        print(f"{antecedent} -> {consequent}: {interest}")
+    # The single-item counts come back from the miner and the mined supports
+    # are reused, so scoring the rules needs no further pass over the data
+    support_index = SupportIndex(total_transactions, item_counts)
+    support_index.update(frequent_itemsets)
+    support_index.update(frequent_pairs)
+    support_index.update(frequent_triples)
+    top_5_rules = score_rules(frequent_triples, support_index, top_n=5)
 
-    # Generate association rules based on lift 
-    total_transactions = len(transactions)
-    top_5_rules_lift = lift_based_top_rules(frequent_triples, frequent_itemsets)
-    print('\n')
-    print("Top 5 association rules based on lift:")
-    for rule in top_5_rules_lift:
-        antecedent, consequent, lift = rule
-        print(f"{antecedent} -> {consequent}: {lift}")
+    for metric in RULE_METRICS:
+        print('\n')
+        print(f"Top 5 association rules based on {metric}:")
+        for rule in top_5_rules[metric]:
+            antecedent, consequent, score = rule
+            print(f"{antecedent} -> {consequent}: {score}")
 
     print('\n')
\ No newline at end of file
@@ -1,23 +1,114 @@
+import argparse
+import hashlib
+import json
 import random
+import time
+from functools import lru_cache
+from multiprocessing import Pool
 from hazm import Normalizer, Stemmer, word_tokenize, stopwords_list
 import itertools
 import os
 
+from eclat import VerticalIndex
+from stages import NULL_PROFILER
+
+PREPROCESS_CACHE_DIR_NAME = '.preprocess_cache'
+STEM_CACHE_SIZE = 100000
+
 def read_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         lines = file.readlines()[2:]  
     return [line.strip() for line in lines]
 
-def preprocess_data(lines):
-    preprocessed_lines = []
-    stemmer = Stemmer()
-    normalizer = Normalizer()
-    for line in lines:
-        normalized_text = normalizer.normalize(line)
-        tokens = word_tokenize(normalized_text)
-        tokens = [token for token in tokens if token not in stopwords_list()]
-        tokens = [stemmer.stem(token) for token in tokens]
-        preprocessed_lines.append(tokens)
+def load_stopwords():
+    return frozenset(stopwords_list())
+
+class Preprocessor:
+    # Normalise, tokenise, drop stopwords and stem. The stopword set is built
+    # once and stems are memoised, since verses repeat the same words a lot.
+    # The hazm models are only loaded on first use, so a fully cached run
+    # never pays for them.
+    def __init__(self, stopwords=None, remove_stopwords=True, stem=True, stem_cache_size=STEM_CACHE_SIZE):
+        if not remove_stopwords:
+            stopwords = frozenset()
+        elif stopwords is None:
+            stopwords = load_stopwords()
+        self.stopwords = stopwords
+        self.options = {'remove_stopwords': remove_stopwords, 'stem': stem}
+        self.stem_cache_size = stem_cache_size
+        self.normalizer = None
+        self.stem = None
+
+    def setup(self):
+        self.normalizer = Normalizer()
+        if self.options['stem']:
+            self.stem = lru_cache(maxsize=self.stem_cache_size)(Stemmer().stem)
+
+    def __call__(self, lines):
+        if self.normalizer is None:
+            self.setup()
+        preprocessed_lines = []
+        for line in lines:
+            normalized_text = self.normalizer.normalize(line)
+            tokens = word_tokenize(normalized_text)
+            tokens = [token for token in tokens if token not in self.stopwords]
+            if self.stem is not None:
+                tokens = [self.stem(token) for token in tokens]
+            preprocessed_lines.append(tokens)
+        return preprocessed_lines
+
+# One Preprocessor per pool worker, created by the pool initializer
+worker_preprocessor = None
+
+def init_worker_preprocessor(stopwords, options):
+    global worker_preprocessor
+    worker_preprocessor = Preprocessor(stopwords, **options)
+
+def preprocess_chunk(lines):
+    return worker_preprocessor(lines)
+
+def preprocess_data(lines, preprocessor=None, workers=1, chunk_size=2000):
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    if workers <= 1:
+        return preprocessor(lines)
+    chunks = [lines[i:i + chunk_size] for i in range(0, len(lines), chunk_size)]
+    initargs = (preprocessor.stopwords, preprocessor.options)
+    with Pool(workers, initializer=init_worker_preprocessor, initargs=initargs) as pool:
+        preprocessed_chunks = pool.map(preprocess_chunk, chunks)
+    return [tokens for chunk in preprocessed_chunks for tokens in chunk]
+
+def preprocess_cache_path(file_path, preprocessor, cache_dir=None):
+    # Keyed by the poet file (path, size, mtime) and everything that changes
+    # the tokens, so a rerun with other support thresholds reuses the entry
+    stat = os.stat(file_path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), PREPROCESS_CACHE_DIR_NAME)
+    key = {
+        'file': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'options': preprocessor.options,
+        'stopwords': sorted(preprocessor.stopwords),
+    }
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest[:16]}.json")
+
+def load_preprocessed(file_path, preprocessor=None, workers=1, cache_dir=None):
+    # Token lists of the poet file in file order, from the cache when possible
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    cache_path = preprocess_cache_path(file_path, preprocessor, cache_dir)
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    preprocessed_lines = preprocess_data(read_file(file_path), preprocessor, workers)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(preprocessed_lines, file, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
     return preprocessed_lines
 
 def split_data(data, split_ratio=0.8):
@@ -34,20 +125,26 @@ def generate_candidates(data, itemset_size):
             candidates.add(frozenset(candidate))
     return candidates
 
-def count_support(data, candidates):
+def count_support(data, candidates, index=None):
+    # Supports come from ANDing the candidate's item bitmaps; candidates
+    # whose prefix was remembered at the previous size reuse its bitmap
+    if index is None:
+        index = VerticalIndex(data)
     support_count = {}
-    for transaction in data:
-        for candidate in candidates:
-            if candidate.issubset(transaction):
-                support_count[candidate] = support_count.get(candidate, 0) + 1
+    for candidate in candidates:
+        count = index.support(candidate)
+        if count:
+            support_count[candidate] = count
     return support_count
 
-def calculate_support(data, frequent_itemsets):
+def calculate_support(data, frequent_itemsets, index=None):
+    # Support of every frequent itemset of every size
+    if index is None:
+        index = VerticalIndex(data)
     support_counts = {}
-    for transaction in data:
-        for itemset in frequent_itemsets:
-            if itemset in transaction:
-                support_counts[itemset] = support_counts.get(itemset, 0) + 1
+    for itemsets in frequent_itemsets.values():
+        for itemset in itemsets:
+            support_counts[itemset] = index.support(itemset)
     return support_counts
 
 def prune_infrequent(candidates, support_count, min_support, prev_support_counts=None):
@@ -64,24 +161,34 @@ def prune_infrequent(candidates, support_count, min_support, prev_support_counts
             frequent_itemsets.add(candidate)
     return frequent_itemsets
 
-def apriori_and_support(data, min_supports):
+def apriori_and_support(data, min_supports, profiler=NULL_PROFILER):
+    # Each level's candidate-gen, count and prune stages, and the final
+    # count of every frequent itemset, are reported to profiler
     frequent_itemsets = {}
     prev_support_counts = None
+    with profiler.stage('index', len(data)):
+        index = VerticalIndex(data)
     max_itemset_size = max(min_supports.keys())
     for itemset_size, min_support in min_supports.items():
         if itemset_size > max_itemset_size:
             break
-        candidates = generate_candidates(data, itemset_size)
-        support_count = count_support(data, candidates)
-        if prev_support_counts:
-            frequent_itemsets_update = prune_infrequent(candidates, support_count, min_support, prev_support_counts)
-        else:
-            frequent_itemsets_update = prune_infrequent(candidates, support_count, min_support)
+        with profiler.stage('candidate-gen'):
+            candidates = generate_candidates(data, itemset_size)
+        profiler.count('candidate-gen', len(candidates))
+        with profiler.stage('count', len(candidates)):
+            support_count = count_support(data, candidates, index)
+        with profiler.stage('prune', len(candidates)):
+            if prev_support_counts:
+                frequent_itemsets_update = prune_infrequent(candidates, support_count, min_support, prev_support_counts)
+            else:
+                frequent_itemsets_update = prune_infrequent(candidates, support_count, min_support)
         if not frequent_itemsets_update:
             break
         frequent_itemsets[itemset_size] = frequent_itemsets_update
+        index.remember(frequent_itemsets_update)
         prev_support_counts = support_count
-    support_counts = calculate_support(data, frequent_itemsets)
+    with profiler.stage('count'):
+        support_counts = calculate_support(data, frequent_itemsets, index)
     return frequent_itemsets, support_counts
 
 def print_line_with_tokens(line, tokens):
@@ -133,87 +240,159 @@ def save_rules_to_file(association_rules, poet_name, output_folder):
             file.write(rule_text + "\n")
     print(f"Association rules for {poet_name} saved to {filepath}")
 
-file1 = read_file('saadi.txt')
-# file2 = read_file('rumi.txt')
-# file3 = read_file('ferdousi.txt')
-# file4 = read_file('hafez.txt')
-# file4 = read_file('khayyam.txt')
-
-random.shuffle(file1)
-# random.shuffle(file2)
-# random.shuffle(file3)
-# random.shuffle(file4)
-# random.shuffle(file5)
-
-preprocessed_file1 = preprocess_data(file1)
-# preprocessed_file2 = preprocess_data(file2)
-# preprocessed_file2 = preprocess_data(file3)
-# preprocessed_file2 = preprocess_data(file4)
-# preprocessed_file2 = preprocess_data(file5)
-
-training_data_file1, testing_data_file1 = split_data(preprocessed_file1)
-# training_data_file2, testing_data_file2 = split_data(preprocessed_file2)
-# training_data_file2, testing_data_file2 = split_data(preprocessed_file3)
-# training_data_file2, testing_data_file2 = split_data(preprocessed_file4)
-# training_data_file2, testing_data_file2 = split_data(preprocessed_file4)
-
-# Example of one entry after preprocess
-# print("saadi:")
-# print_line_with_tokens(file1[0], preprocessed_file1[0])
-# print("rumi:")
-# print_line_with_tokens(file2[0], preprocessed_file2[0])
-
-# support_counts_file1 = count_support(training_data_file1)
-# support_counts_file2 = count_support(training_data_file2)
-# support_counts_file3 = count_support(training_data_file3)
-# support_counts_file4 = count_support(training_data_file4)
-# support_counts_file4 = count_support(training_data_file5)
-
-# Print all of the words with their supports
-# print("Support Counts for saadi:", support_counts_file1)
-# print("Support Counts for rumi:", support_counts_file2)
-
-# Calculate average support for each dataset
-# average_support_file1 = average_support(support_counts_file1)
-# print("Average Support for saadi:", average_support_file1)
-# average_support_file2 = average_support(support_counts_file2)
-# print("Average Support for rumi:", average_support_file2)
-
-# Number of words all over the file
-# words_counts_file1 = count_word_occurrences(training_data_file1)
-# all_word_counts_file1 = sum(1 for count in words_counts_file1.values() if count > 0)
-# print("Number of words in saadi file:", all_word_counts_file1)
-# words_counts_file2 = count_word_occurrences(training_data_file2)
-# all_word_counts_file2 = sum(1 for count in words_counts_file2.values() if count > 0)
-# print("Number of words in saadi file:", all_word_counts_file2)
-
-# find freq items given the threshold
-# min_support_threshold_saadi = 8
-# words_with_min_support_file1 = sum(1 for count in words_counts_file1.values() if count >= min_support_threshold_saadi)
-# print("Number of words in saadi file with support more than 8:", words_with_min_support_file1)
-# min_support_threshold_rumi = 10
-# words_with_min_support_file2 = sum(1 for count in words_counts_file2.values() if count >= min_support_threshold_rumi)
-# print("Number of words in rumi file with support more than 10:", words_with_min_support_file2)
-
-# min_supports = {1: 8, 2: 6} 
-# frequent_itemsets, support_counts = apriori_with_support(training_data_file1, min_supports)
-# print("Frequent Itemsets:", frequent_itemsets)
-
-min_supports = {1: 10, 2: 8, 3: 6, 4: 4}
-
-# Find frequent itemsets of sizes 1, 2, and 3
-frequent_itemsets, support_counts = apriori_and_support(training_data_file1, min_supports)
-
-# print("Frequent Itemsets (Size 1):", frequent_itemsets.get(1, set()))
-# print("Frequent Itemsets (Size 2):", frequent_itemsets.get(2, set()))
-# print("Frequent Itemsets (Size 3):", frequent_itemsets.get(3, set()))
-# print("Frequent Itemsets (Size 4):", frequent_itemsets.get(4, set()))
-
-# poem_files = {frozenset([word]): "saadismpl" for word in frequent_itemsets.get(1, set())}
-# output_folder = "./"
-
-# Example of a min confidence
-min_confidence = 0.5
-itemset_size = 2 
-association_rules = generate_association_rules(frequent_itemsets, support_counts, min_confidence, 'saadi', itemset_size)
-save_rules_to_file(association_rules, 'saadi', '/Users/sana/Desktop')
+def find_corpora(corpus_dir):
+    # Every poet file in the folder, e.g. saadi.txt -> 'saadi'
+    corpora = {}
+    for entry in sorted(os.listdir(corpus_dir)):
+        if entry.endswith('.txt') and not entry.endswith('_rules.txt'):
+            corpora[os.path.splitext(entry)[0]] = os.path.join(corpus_dir, entry)
+    return corpora
+
+def mine_poet(job):
+    poet_name, file_path, min_supports, min_confidence, itemset_size, output_folder, seed, cache_dir = job
+    timings = {}
+    start = time.perf_counter()
+    preprocessed_lines = load_preprocessed(file_path, worker_preprocessor, cache_dir=cache_dir)
+    timings['preprocess'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    random.Random(seed).shuffle(preprocessed_lines)
+    training_data, testing_data = split_data(preprocessed_lines)
+    timings['split'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frequent_itemsets, support_counts = apriori_and_support(training_data, min_supports)
+    timings['apriori'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    association_rules = generate_association_rules(frequent_itemsets, support_counts, min_confidence, poet_name, itemset_size)
+    timings['rules'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    save_rules_to_file(association_rules, poet_name, output_folder)
+    timings['save'] = time.perf_counter() - start
+    return poet_name, timings
+
+def mine_corpora(corpus_dir, output_folder, min_supports, min_confidence=0.5, itemset_size=2,
+                 workers=None, seed=None, cache_dir=None):
+    # Runs preprocess -> apriori_and_support -> generate_association_rules ->
+    # save_rules_to_file for every poet in corpus_dir, one poet's whole
+    # pipeline per worker, largest file first so a big poet does not start
+    # last. Every worker builds one Preprocessor (one stopword set, one stem
+    # cache) for all the poets it handles, and the hazm work is served from
+    # the on-disk cache on reruns. Returns {poet: {stage: seconds}}.
+    os.makedirs(output_folder, exist_ok=True)
+    corpora = find_corpora(corpus_dir)
+    preprocessor = Preprocessor()
+    jobs = [(poet_name, file_path, min_supports, min_confidence, itemset_size, output_folder, seed, cache_dir)
+            for poet_name, file_path in corpora.items()]
+    jobs.sort(key=lambda job: os.path.getsize(job[1]), reverse=True)
+
+    timings = {}
+    initargs = (preprocessor.stopwords, preprocessor.options)
+    with Pool(workers, initializer=init_worker_preprocessor, initargs=initargs) as pool:
+        for poet_name, poet_timings in pool.imap_unordered(mine_poet, jobs):
+            timings[poet_name] = poet_timings
+    # In the order of find_corpora, like before
+    return {poet_name: timings[poet_name] for poet_name in corpora}
+
+def print_timings(timings):
+    stages = ['preprocess', 'split', 'apriori', 'rules', 'save']
+    print("poet".ljust(12) + "".join(stage.rjust(12) for stage in stages) + "total".rjust(12))
+    for poet_name, poet_timings in timings.items():
+        row = [poet_timings.get(stage, 0) for stage in stages]
+        print(poet_name.ljust(12) + "".join(f"{seconds:12.2f}" for seconds in row) + f"{sum(row):12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="worker processes: for preprocessing, or one poet each with --corpus-dir")
+    parser.add_argument("--corpus-dir", help="mine every poet file in this folder concurrently")
+    parser.add_argument("--output-folder", default=".", help="where the *_rules.txt files are written")
+    args = parser.parse_args()
+
+    if args.corpus_dir:
+        # One job per poet on a pool of --workers processes
+        timings = mine_corpora(args.corpus_dir, args.output_folder, {1: 10, 2: 8, 3: 6, 4: 4},
+                               min_confidence=0.5, itemset_size=2, workers=args.workers)
+        print_timings(timings)
+    else:
+        # The hazm work is cached on disk, so only the first run pays for it
+        preprocessed_file1 = load_preprocessed('saadi.txt', workers=args.workers)
+        # preprocessed_file2 = load_preprocessed('rumi.txt', workers=args.workers)
+        # preprocessed_file3 = load_preprocessed('ferdousi.txt', workers=args.workers)
+        # preprocessed_file4 = load_preprocessed('hafez.txt', workers=args.workers)
+        # preprocessed_file5 = load_preprocessed('khayyam.txt', workers=args.workers)
+
+        random.shuffle(preprocessed_file1)
+        # random.shuffle(preprocessed_file2)
+        # random.shuffle(preprocessed_file3)
+        # random.shuffle(preprocessed_file4)
+        # random.shuffle(preprocessed_file5)
+
+        training_data_file1, testing_data_file1 = split_data(preprocessed_file1)
+        # training_data_file2, testing_data_file2 = split_data(preprocessed_file2)
+        # training_data_file2, testing_data_file2 = split_data(preprocessed_file3)
+        # training_data_file2, testing_data_file2 = split_data(preprocessed_file4)
+        # training_data_file2, testing_data_file2 = split_data(preprocessed_file4)
+
+        # Example of one entry after preprocess
+        # print("saadi:")
+        # print_line_with_tokens(file1[0], preprocessed_file1[0])
+        # print("rumi:")
+        # print_line_with_tokens(file2[0], preprocessed_file2[0])
+
+        # support_counts_file1 = count_support(training_data_file1)
+        # support_counts_file2 = count_support(training_data_file2)
+        # support_counts_file3 = count_support(training_data_file3)
+        # support_counts_file4 = count_support(training_data_file4)
+        # support_counts_file4 = count_support(training_data_file5)
+
+        # Print all of the words with their supports
+        # print("Support Counts for saadi:", support_counts_file1)
+        # print("Support Counts for rumi:", support_counts_file2)
+
+        # Calculate average support for each dataset
+        # average_support_file1 = average_support(support_counts_file1)
+        # print("Average Support for saadi:", average_support_file1)
+        # average_support_file2 = average_support(support_counts_file2)
+        # print("Average Support for rumi:", average_support_file2)
+
+        # Number of words all over the file
+        # words_counts_file1 = count_word_occurrences(training_data_file1)
+        # all_word_counts_file1 = sum(1 for count in words_counts_file1.values() if count > 0)
+        # print("Number of words in saadi file:", all_word_counts_file1)
+        # words_counts_file2 = count_word_occurrences(training_data_file2)
+        # all_word_counts_file2 = sum(1 for count in words_counts_file2.values() if count > 0)
+        # print("Number of words in saadi file:", all_word_counts_file2)
+
+        # find freq items given the threshold
+        # min_support_threshold_saadi = 8
+        # words_with_min_support_file1 = sum(1 for count in words_counts_file1.values() if count >= min_support_threshold_saadi)
+        # print("Number of words in saadi file with support more than 8:", words_with_min_support_file1)
+        # min_support_threshold_rumi = 10
+        # words_with_min_support_file2 = sum(1 for count in words_counts_file2.values() if count >= min_support_threshold_rumi)
+        # print("Number of words in rumi file with support more than 10:", words_with_min_support_file2)
+
+        # min_supports = {1: 8, 2: 6} 
+        # frequent_itemsets, support_counts = apriori_with_support(training_data_file1, min_supports)
+        # print("Frequent Itemsets:", frequent_itemsets)
+
+        min_supports = {1: 10, 2: 8, 3: 6, 4: 4}
+
+        # Find frequent itemsets of sizes 1, 2, and 3
+        frequent_itemsets, support_counts = apriori_and_support(training_data_file1, min_supports)
+
+        # print("Frequent Itemsets (Size 1):", frequent_itemsets.get(1, set()))
+        # print("Frequent Itemsets (Size 2):", frequent_itemsets.get(2, set()))
+        # print("Frequent Itemsets (Size 3):", frequent_itemsets.get(3, set()))
+        # print("Frequent Itemsets (Size 4):", frequent_itemsets.get(4, set()))
+
+        # poem_files = {frozenset([word]): "saadismpl" for word in frequent_itemsets.get(1, set())}
+        # output_folder = "./"
+
+        # Example of a min confidence
+        min_confidence = 0.5
+        itemset_size = 2 
+        association_rules = generate_association_rules(frequent_itemsets, support_counts, min_confidence, 'saadi', itemset_size)
+        save_rules_to_file(association_rules, 'saadi', args.output_folder)
@@ -0,0 +1,132 @@
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from eclat import VerticalIndex
+from fpgrowth import fp_growth
+from mapreduce import read_chunk_lines, read_chunk_rows, split_file
+
+# Chunks are cut so that each is at most this many bytes of input; a worker
+# holds one chunk's transactions (and its local mining state) at a time
+DEFAULT_CHUNK_BYTES = 1 << 26
+
+
+def read_transactions(filename, start, end, fmt='csv'):
+    # The transactions whose line starts in [start, end): 'csv' rows like
+    # store.csv, one basket per row, or 'tsv' lines of tab-separated items
+    if fmt == 'csv':
+        for row in read_chunk_rows(filename, start, end, skip_header=False):
+            yield set(row)
+    elif fmt == 'tsv':
+        for line in read_chunk_lines(filename, start, end):
+            line = line.rstrip('\r\n')
+            yield set(line.split('\t')) if line else set()
+    else:
+        raise ValueError(f"unknown format {fmt!r}")
+
+def iter_transactions(filename, fmt='csv'):
+    return read_transactions(filename, 0, os.path.getsize(filename), fmt)
+
+def split_chunks(filename, workers, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # At least one chunk per worker, and more when the file is large
+    size = os.path.getsize(filename)
+    return split_file(filename, max(workers, -(-size // chunk_bytes), 1))
+
+
+def scale_support(min_support, fraction_numerator, fraction_denominator):
+    # ceil(min_support * chunk bytes / file bytes), for one threshold or a
+    # {size: threshold} dict. The chunk fractions sum to 1, so an itemset
+    # below the scaled threshold in every chunk is below min_support overall.
+    def scale(threshold):
+        return max(1, -(-threshold * fraction_numerator // fraction_denominator))
+    if isinstance(min_support, dict):
+        return {size: scale(threshold) for size, threshold in min_support.items()}
+    return scale(min_support)
+
+def mine_chunk(task):
+    # Pass 1: the itemsets frequent within one chunk at its scaled threshold
+    filename, start, end, fmt, min_support, size, mine = task
+    transactions = list(read_transactions(filename, start, end, fmt))
+    return list(mine(transactions, scale_support(min_support, end - start, size)))
+
+def count_chunk(task):
+    # Pass 2: exact supports of every candidate within one chunk, level by
+    # level so each candidate's bitmap starts from its cached prefix; only
+    # the previous level's bitmaps are kept. The chunk's index holds every
+    # item's bitmap anyway, so their supports and the number of transactions
+    # come back too.
+    filename, start, end, fmt, candidates = task
+    index = VerticalIndex(read_transactions(filename, start, end, fmt))
+    counts = np.zeros(len(candidates), dtype=np.int64)
+    level = {}
+    for position, candidate in enumerate(candidates):
+        if level and len(candidate) != len(next(iter(level))):
+            index.cache = level
+            level = {}
+        bitmap = index.bitmap(candidate)
+        counts[position] = bitmap.bit_count()
+        level[candidate] = bitmap
+    item_counts = {item: bitmap.bit_count() for item, bitmap in index.items.items()}
+    return counts, index.num_transactions, item_counts
+
+def sort_itemsets(itemsets):
+    # Level by level, like the Apriori loop, then by items
+    return sorted((tuple(sorted(itemset)) for itemset in itemsets), key=lambda items: (len(items), items))
+
+def count_in_pool(pool, filename, chunks, fmt, candidates):
+    # {candidate: count}, the number of transactions and {item: count} of
+    # every item, over all chunks
+    candidates = sort_itemsets(candidates)
+    tasks = [(filename, start, end, fmt, candidates) for start, end in chunks]
+    totals = np.zeros(len(candidates), dtype=np.int64)
+    num_transactions = 0
+    item_counts = {}
+    for counts, chunk_transactions, chunk_items in pool.imap_unordered(count_chunk, tasks):
+        totals += counts
+        num_transactions += chunk_transactions
+        for item, count in chunk_items.items():
+            item_counts[item] = item_counts.get(item, 0) + count
+    itemset_counts = {frozenset(candidate): int(count) for candidate, count in zip(candidates, totals) if count}
+    return itemset_counts, num_transactions, item_counts
+
+def count_itemsets(filename, candidates, fmt='csv', workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # Exact support of every candidate over the whole file, one chunk per
+    # task; candidates that never occur are left out
+    workers = workers or os.cpu_count() or 1
+    if not candidates:
+        return {}
+    with Pool(workers) as pool:
+        return count_in_pool(pool, filename, split_chunks(filename, workers, chunk_bytes), fmt, candidates)[0]
+
+def meets(itemset, count, min_support):
+    if isinstance(min_support, dict):
+        return len(itemset) in min_support and count >= min_support[len(itemset)]
+    return count >= min_support
+
+def son_frequent_itemsets(filename, min_support, fmt='csv', workers=None, mine=fp_growth,
+                          chunk_bytes=DEFAULT_CHUNK_BYTES, return_items=False):
+    # SON (Savasere, Omiecinski, Navathe): pass 1 mines every chunk of the
+    # file on its own with the threshold scaled to the chunk's share of the
+    # bytes; an itemset frequent overall is frequent in at least one chunk,
+    # so the union of the local results holds every frequent itemset. Pass 2
+    # counts that union exactly over all chunks and keeps those reaching
+    # min_support, so the result equals mining the whole file at once.
+    # mine(transactions, min_support) returns {itemset: count} and must be
+    # picklable; min_support is one threshold or a {size: threshold} dict.
+    # Only one chunk per worker is ever in memory. With return_items, also
+    # returns the number of transactions and the support of every item,
+    # frequent or not, counted in pass 2.
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(filename)
+    chunks = split_chunks(filename, workers, chunk_bytes)
+    tasks = [(filename, start, end, fmt, min_support, size, mine) for start, end in chunks]
+    candidates = set()
+    with Pool(workers) as pool:
+        for local_itemsets in pool.imap_unordered(mine_chunk, tasks):
+            candidates.update(local_itemsets)
+        counts, num_transactions, item_counts = count_in_pool(pool, filename, chunks, fmt, candidates)
+    frequent_itemsets = {itemset: count for itemset, count in counts.items() if meets(itemset, count, min_support)}
+    if return_items:
+        return frequent_itemsets, num_transactions, item_counts
+    return frequent_itemsets
@@ -0,0 +1,16 @@
+from contextlib import nullcontext
+
+# The pipeline functions take an optional profiler (benchmarks/profiling.py)
+# and report their stages to it; without one they get this stand-in, whose
+# hooks do nothing.
+
+
+class NullProfiler:
+    def stage(self, name, items=None):
+        return nullcontext(self)
+
+    def count(self, name, items):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,120 @@
+import hashlib
+import heapq
+import math
+import random
+
+
+def top_k(items, k, key=None):
+    # Same result as sorted(items, key=key)[:k], ties included, but only k
+    # items are ever held in the heap
+    return heapq.nsmallest(k, items, key=key)
+
+def by_count(item):
+    return -item[1]
+
+
+class SpaceSaving:
+    # Space-Saving (Metwally et al.) over a stream of (item, weight) updates,
+    # with at most `capacity` counters. For a stream of total weight N:
+    #   * every reported count overestimates the true count by at most its
+    #     error, and error <= N / capacity
+    #   * every item whose true count exceeds N / capacity is monitored
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+        self.heap = []
+        self.total = 0
+
+    def update(self, item, weight=1):
+        self.total += weight
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[item] = [weight, 0]
+        else:
+            # Take over the smallest counter; its count becomes our error
+            min_count, min_item = self.pop_min()
+            del self.counters[min_item]
+            counter = self.counters[item] = [min_count + weight, min_count]
+        heapq.heappush(self.heap, (counter[0], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, key) for key, (count, error) in self.counters.items()]
+            heapq.heapify(self.heap)
+
+    def pop_min(self):
+        # The heap holds stale entries for counters that grew since they were
+        # pushed; skip them until the top matches its counter
+        while True:
+            count, item = heapq.heappop(self.heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                return count, item
+
+    def error_bound(self):
+        return self.total / self.capacity
+
+    def top(self, k, key=by_count):
+        # Returns (item, estimated count, error) sorted by key on (item, count)
+        items = [(item, count, error) for item, (count, error) in self.counters.items()]
+        return top_k(items, k, key=key)
+
+
+class CountMinTopK:
+    # Count-Min sketch plus a heap of the k heaviest items seen so far. With
+    # width w = ceil(e / epsilon) and depth d = ceil(ln(1 / delta)), an estimate
+    # never undercounts and exceeds the true count by more than epsilon * N
+    # with probability at most delta, using w * d counters and k heap entries.
+    def __init__(self, k, epsilon=0.0001, delta=0.001, seed=0):
+        self.k = k
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.tables = [[0] * self.width for _ in range(self.depth)]
+        # One independently keyed BLAKE2b per row, so the rows' columns are
+        # independent hash functions as the bound above assumes
+        rng = random.Random(seed)
+        self.salts = [rng.getrandbits(128).to_bytes(16, 'little') for _ in range(self.depth)]
+        self.heavy = {}
+        self.heap = []
+        self.total = 0
+
+    def columns(self, item):
+        data = repr(item).encode('utf-8')
+        return [int.from_bytes(hashlib.blake2b(data, digest_size=8, salt=salt).digest(), 'little') % self.width
+                for salt in self.salts]
+
+    def estimate(self, item):
+        return min(table[column] for table, column in zip(self.tables, self.columns(item)))
+
+    def update(self, item, weight=1):
+        self.total += weight
+        estimate = None
+        for table, column in zip(self.tables, self.columns(item)):
+            table[column] += weight
+            if estimate is None or table[column] < estimate:
+                estimate = table[column]
+        if item not in self.heavy and len(self.heavy) >= self.k:
+            # Estimates only grow, so the lightest heavy hitter is the one to evict
+            lightest_estimate, lightest = self.peek_min()
+            if estimate <= lightest_estimate:
+                return
+            heapq.heappop(self.heap)
+            del self.heavy[lightest]
+        self.heavy[item] = estimate
+        heapq.heappush(self.heap, (estimate, item))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(count, key) for key, count in self.heavy.items()]
+            heapq.heapify(self.heap)
+
+    def peek_min(self):
+        while True:
+            estimate, item = self.heap[0]
+            if self.heavy.get(item) == estimate:
+                return estimate, item
+            heapq.heappop(self.heap)
+
+    def error_bound(self):
+        return math.e / self.width * self.total
+
+    def top(self, k, key=by_count):
+        return top_k(self.heavy.items(), k, key=key)
@@ -0,0 +1,298 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+
+FEATURES = ['danceability', 'energy', 'loudness', 'speechiness',
+            'acousticness', 'liveness', 'valence', 'tempo']
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def read_chunks(file_path, columns=FEATURES, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Only chunk_size rows of the selected columns are in memory at a time
+    for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunk_size):
+        yield chunk[columns].to_numpy(dtype=np.float64)
+
+def iter_chunks(data, columns=FEATURES, chunk_size=DEFAULT_CHUNK_SIZE):
+    # data is a CSV path or an in-memory array
+    if isinstance(data, str):
+        yield from read_chunks(data, columns, chunk_size)
+    else:
+        data = np.asarray(data, dtype=np.float64)
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+
+def initialize_centroids(data, k, seed=42):
+    rng = np.random.default_rng(seed)
+    centroids_idx = rng.choice(data.shape[0], size=k, replace=False)
+    return data[centroids_idx]
+
+def assign_to_centroids(data, centroids):
+    # n x k distances only, never the n x k x d broadcast
+    return np.argmin(cdist(data, centroids, 'sqeuclidean'), axis=1)
+
+def grouped_sums(labels, values, num_groups):
+    return np.stack([np.bincount(labels, weights=values[:, column], minlength=num_groups)
+                     for column in range(values.shape[1])], axis=1)
+
+def update_centroids(data, labels, centroids):
+    # A cluster that lost all its points keeps its previous centroid
+    counts = np.bincount(labels, minlength=len(centroids))
+    sums = grouped_sums(labels, data, len(centroids))
+    return np.where(counts[:, np.newaxis] > 0, sums / np.maximum(counts, 1)[:, np.newaxis], centroids)
+
+def kmeans(data, k, max_iterations=100, seed=42):
+    centroids = initialize_centroids(data, k, seed)
+    for _ in range(max_iterations):
+        labels = assign_to_centroids(data, centroids)
+        new_centroids = update_centroids(data, labels, centroids)
+        if np.allclose(centroids, new_centroids):
+            break
+        centroids = new_centroids
+    return centroids, assign_to_centroids(data, centroids)
+
+
+class Summaries:
+    # N, SUM and SUMSQ of a set of clusters, one row per cluster. This is all
+    # BFR keeps of the points in the discard and compressed sets.
+    def __init__(self, dimensions, min_variance=1e-6):
+        self.n = np.zeros(0)
+        self.sums = np.zeros((0, dimensions))
+        self.sumsq = np.zeros((0, dimensions))
+        self.min_variance = min_variance
+
+    def __len__(self):
+        return len(self.n)
+
+    def append(self, n, sums, sumsq):
+        self.n = np.concatenate((self.n, n))
+        self.sums = np.vstack((self.sums, sums))
+        self.sumsq = np.vstack((self.sumsq, sumsq))
+
+    def append_points(self, points, labels, num_clusters):
+        self.append(np.bincount(labels, minlength=num_clusters),
+                    grouped_sums(labels, points, num_clusters),
+                    grouped_sums(labels, points * points, num_clusters))
+
+    def add(self, points, labels):
+        # Folds each point into the existing cluster given by labels
+        self.n += np.bincount(labels, minlength=len(self))
+        self.sums += grouped_sums(labels, points, len(self))
+        self.sumsq += grouped_sums(labels, points * points, len(self))
+
+    def add_summaries(self, other, labels):
+        # Folds every cluster of other into the cluster given by labels
+        np.add.at(self.n, labels, other.n)
+        np.add.at(self.sums, labels, other.sums)
+        np.add.at(self.sumsq, labels, other.sumsq)
+
+    def subset(self, rows):
+        subset = Summaries(self.sums.shape[1], self.min_variance)
+        subset.append(self.n[rows], self.sums[rows], self.sumsq[rows])
+        return subset
+
+    def merge(self, i, j):
+        # Cluster j is folded into cluster i and left empty (N = 0), so the
+        # other rows keep their positions; subset() drops the empty ones
+        self.n[i] += self.n[j]
+        self.sums[i] += self.sums[j]
+        self.sumsq[i] += self.sumsq[j]
+        self.n[j] = 0
+        self.sums[j] = 0
+        self.sumsq[j] = 0
+
+    def means(self, totals):
+        # totals / N per cluster; clusters with N = 0 get zeros instead of NaN
+        n = self.n[:, np.newaxis]
+        return np.divide(totals, n, out=np.zeros_like(totals), where=n > 0)
+
+    def centroids(self):
+        return self.means(self.sums)
+
+    def variances(self):
+        centroids = self.centroids()
+        return np.maximum(self.means(self.sumsq) - centroids * centroids, self.min_variance)
+
+    def mahalanobis(self, points):
+        # points x clusters distances, each cluster with its own diagonal
+        # covariance, expanded into matrix products so no points x clusters
+        # x dimensions tensor is built
+        centroids = self.centroids()
+        inverse = 1 / self.variances()
+        squared = (points * points) @ inverse.T - 2 * points @ (centroids * inverse).T \
+            + (centroids * centroids * inverse).sum(axis=1)
+        return np.sqrt(np.maximum(squared, 0))
+
+    def merge_distances(self, i):
+        # max(distance of centroid i to every cluster, distance of every
+        # centroid to cluster i): row i of the symmetric matrix BFR merges on
+        centroids = self.centroids()
+        to_clusters = self.mahalanobis(centroids[i:i + 1])[0]
+        to_i = self.subset([i]).mahalanobis(centroids)[:, 0]
+        return np.maximum(to_clusters, to_i)
+
+    def nearest(self, points):
+        # Empty clusters (N = 0) are never the nearest
+        distances = self.mahalanobis(points)
+        distances[:, self.n == 0] = np.inf
+        labels = np.argmin(distances, axis=1)
+        return labels, distances[np.arange(len(points)), labels]
+
+
+class BFR:
+    # Bradley-Fayyad-Reina clustering in one pass over chunks of points.
+    #   DS (discard set): the k clusters, as N/SUM/SUMSQ summaries
+    #   CS (compressed set): summaries of mini-clusters close to no DS cluster
+    #   RS (retained set): points that fit nowhere yet
+    # A point joins the nearest DS cluster, else the nearest CS cluster, when
+    # its Mahalanobis distance is below threshold (2 * sqrt(d) by default,
+    # about two standard deviations per dimension). The rest are clustered
+    # with the RS by k-means; mini-clusters of two or more points become CS
+    # clusters and singletons stay in the RS. CS clusters whose centroids are
+    # within threshold of each other are merged. Memory is bounded by the
+    # summaries and the RS, not by the number of points seen.
+    def __init__(self, k, threshold=None, cs_cluster_size=10, min_variance=1e-6, seed=42):
+        self.k = k
+        self.threshold = threshold
+        self.cs_cluster_size = cs_cluster_size
+        self.min_variance = min_variance
+        self.seed = seed
+        self.discard = None
+        self.compressed = None
+        self.retained = None
+        self.pending = []
+
+    def start(self, points):
+        dimensions = points.shape[1]
+        if self.threshold is None:
+            self.threshold = 2 * np.sqrt(dimensions)
+        centroids, labels = kmeans(points, self.k, seed=self.seed)
+        # k-means can leave clusters empty (e.g. when it was seeded with
+        # duplicate rows); they are dropped, so the DS may hold fewer than k
+        # clusters but every one of them has points
+        clusters = np.flatnonzero(np.bincount(labels, minlength=self.k))
+        self.discard = Summaries(dimensions, self.min_variance)
+        self.discard.append_points(points, np.searchsorted(clusters, labels), len(clusters))
+        self.compressed = Summaries(dimensions, self.min_variance)
+        self.retained = np.zeros((0, dimensions))
+
+    def fit_chunk(self, points):
+        if self.discard is None:
+            # The first k-means needs at least k points
+            self.pending.append(points)
+            if sum(len(chunk) for chunk in self.pending) >= self.k:
+                self.start(np.vstack(self.pending))
+                self.pending = []
+            return
+        labels, distances = self.discard.nearest(points)
+        close = distances < self.threshold
+        self.discard.add(points[close], labels[close])
+        points = points[~close]
+
+        if len(self.compressed) and len(points):
+            labels, distances = self.compressed.nearest(points)
+            close = distances < self.threshold
+            self.compressed.add(points[close], labels[close])
+            points = points[~close]
+
+        self.compress(np.vstack((self.retained, points)))
+        self.merge_compressed()
+        self.promote_compressed()
+
+    def compress(self, points):
+        if len(points) < 2:
+            self.retained = points
+            return
+        num_clusters = max(1, len(points) // self.cs_cluster_size)
+        centroids, labels = kmeans(points, num_clusters, seed=self.seed)
+        counts = np.bincount(labels, minlength=num_clusters)
+        grouped = counts[labels] > 1
+        self.retained = points[~grouped]
+        clusters = np.flatnonzero(counts > 1)
+        if len(clusters):
+            renumbered = np.searchsorted(clusters, labels[grouped])
+            self.compressed.append_points(points[grouped], renumbered, len(clusters))
+
+    def merge_compressed(self):
+        # A pair merges when each centroid is within threshold of the other
+        # cluster, closest pair first. The distance matrix is built once,
+        # along with each row's nearest column; a merge only recomputes the
+        # merged cluster's row and column, masks out the absorbed one (it is
+        # dropped at the end) and rescans the rows whose nearest was either.
+        if len(self.compressed) < 2:
+            return
+        distances = self.compressed.mahalanobis(self.compressed.centroids())
+        distances = np.maximum(distances, distances.T)
+        np.fill_diagonal(distances, np.inf)
+        rows = np.arange(len(distances))
+        alive = np.ones(len(distances), dtype=bool)
+        nearest = distances.argmin(axis=1)
+        closest = distances[rows, nearest]
+        while True:
+            i = np.argmin(closest)
+            i, j = sorted((i, nearest[i]))
+            if distances[i, j] >= self.threshold:
+                break
+            self.compressed.merge(i, j)
+            alive[j] = False
+            distances[j, :] = distances[:, j] = np.inf
+            row = np.where(alive, self.compressed.merge_distances(i), np.inf)
+            row[i] = np.inf
+            distances[i, :] = distances[:, i] = row
+            # Ties go to the lower column, as with argmin over the matrix
+            stale = (nearest == i) | (nearest == j)
+            stale[i] = True
+            closer = ~stale & ((row < closest) | ((row == closest) & (i < nearest)))
+            nearest[closer] = i
+            closest[closer] = row[closer]
+            nearest[stale] = distances[stale].argmin(axis=1)
+            closest[stale] = distances[stale, nearest[stale]]
+        if not alive.all():
+            self.compressed = self.compressed.subset(np.flatnonzero(alive))
+
+    def promote_compressed(self):
+        # While the DS is short of k clusters (see start), the largest CS
+        # clusters become DS clusters
+        missing = self.k - len(self.discard)
+        if missing <= 0 or not len(self.compressed):
+            return
+        order = np.argsort(-self.compressed.n, kind='stable')
+        promoted = self.compressed.subset(order[:missing])
+        self.discard.append(promoted.n, promoted.sums, promoted.sumsq)
+        self.compressed = self.compressed.subset(np.sort(order[missing:]))
+
+    def finish(self):
+        # The CS clusters and RS points left at the end join their nearest
+        # DS cluster
+        if self.pending:
+            self.start(np.vstack(self.pending))
+            self.pending = []
+        if len(self.compressed):
+            labels, _ = self.discard.nearest(self.compressed.centroids())
+            self.discard.add_summaries(self.compressed, labels)
+            self.compressed = Summaries(self.discard.sums.shape[1], self.min_variance)
+        if len(self.retained):
+            labels, _ = self.discard.nearest(self.retained)
+            self.discard.add(self.retained, labels)
+            self.retained = self.retained[:0]
+        return self
+
+    def centroids(self):
+        return self.discard.centroids()
+
+    def predict(self, points):
+        return self.discard.nearest(points)[0]
+
+
+def bfr_clustering(data, k, columns=FEATURES, chunk_size=DEFAULT_CHUNK_SIZE, labels=True, **options):
+    # One pass over data (a CSV path or an array) builds the clusters; with
+    # labels=True a second pass labels every point by its nearest cluster
+    model = BFR(k, **options)
+    for chunk in iter_chunks(data, columns, chunk_size):
+        model.fit_chunk(chunk)
+    model.finish()
+    if not labels:
+        return model.centroids(), None
+    predicted = [model.predict(chunk) for chunk in iter_chunks(data, columns, chunk_size)]
+    return model.centroids(), np.concatenate(predicted)
@@ -0,0 +1,134 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
+
+# Rows of data compared against all representatives at once in pass two
+DEFAULT_CHUNK_SIZE = 8192
+
+
+def nearest_clusters(centroids, active, rows):
+    # Nearest active cluster (by squared centroid distance) of each cluster
+    # in rows, never the cluster itself
+    rows = np.asarray(rows)
+    distances = cdist(centroids[rows], centroids, 'sqeuclidean')
+    distances[:, ~active] = np.inf
+    distances[np.arange(len(rows)), rows] = np.inf
+    neighbours = np.argmin(distances, axis=1)
+    return neighbours, distances[np.arange(len(rows)), neighbours]
+
+def hierarchical_clustering(sample, num_clusters, chunk_size=1024):
+    # Centroid-linkage agglomeration like the notebook's, without recomputing
+    # every pair on every merge. Each cluster keeps its nearest neighbour and
+    # that distance; a merge folds j into i, recomputes the neighbours of i
+    # and of the clusters that pointed at i or j, and lets every other
+    # cluster switch to i if the merged centroid is now closer. Only
+    # distances involving i change, so the rest stay valid. Each merge is
+    # O(n) vectorised work instead of O(n^2) pairs, and the arrays are
+    # compacted whenever half of their clusters have been merged away.
+    points = np.asarray(sample, dtype=np.float64)
+    n = len(points)
+    centroids = points.copy()
+    sizes = np.ones(n)
+    members = [[index] for index in range(n)]
+    active = np.ones(n, dtype=bool)
+    neighbours = np.empty(n, dtype=np.int64)
+    neighbour_distances = np.empty(n)
+    for start in range(0, n, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, n))
+        neighbours[rows], neighbour_distances[rows] = nearest_clusters(centroids, active, rows)
+
+    remaining = n
+    while remaining > max(num_clusters, 1):
+        if 2 * remaining < len(active):
+            keep = np.flatnonzero(active)
+            positions = np.zeros(len(active), dtype=np.int64)
+            positions[keep] = np.arange(len(keep))
+            centroids, sizes = centroids[keep], sizes[keep]
+            members = [members[index] for index in keep.tolist()]
+            neighbours = positions[neighbours[keep]]
+            neighbour_distances = neighbour_distances[keep]
+            active = np.ones(len(keep), dtype=bool)
+
+        i = int(np.argmin(neighbour_distances))
+        j = int(neighbours[i])
+        i, j = min(i, j), max(i, j)
+        total = sizes[i] + sizes[j]
+        centroids[i] = (sizes[i] * centroids[i] + sizes[j] * centroids[j]) / total
+        sizes[i] = total
+        members[i].extend(members[j])
+        members[j] = None
+        active[j] = False
+        neighbour_distances[j] = np.inf
+        remaining -= 1
+
+        stale = np.flatnonzero(active & ((neighbours == i) | (neighbours == j)))
+        stale = stale[stale != i]
+        distances = cdist(centroids[i:i + 1], centroids, 'sqeuclidean')[0]
+        distances[~active] = np.inf
+        distances[i] = np.inf
+        neighbours[i] = np.argmin(distances)
+        neighbour_distances[i] = distances[neighbours[i]]
+        closer = distances < neighbour_distances
+        neighbours[closer] = i
+        neighbour_distances[closer] = distances[closer]
+        if len(stale):
+            neighbours[stale], neighbour_distances[stale] = nearest_clusters(centroids, active, stale)
+
+    return [points[cluster] for cluster in members if cluster is not None]
+
+# Pass 1: Initial clustering and selecting representatives
+def pass_one(data, sample_size, num_clusters, alpha, seed=None):
+    rng = np.random.default_rng(seed)
+    sample_indices = rng.choice(data.shape[0], min(sample_size, data.shape[0]), replace=False)
+    sample = data[sample_indices]
+
+    initial_clusters = hierarchical_clustering(sample, num_clusters)
+    representatives = []
+
+    for cluster in initial_clusters:
+        centroid = np.mean(cluster, axis=0)
+        dispersed_representatives = select_dispersed_representatives(cluster, alpha)
+        moved_representatives = move_representatives_towards_centroid(dispersed_representatives, centroid, alpha)
+        representatives.append(moved_representatives)
+
+    return initial_clusters, representatives
+
+# Select dispersed representatives for each cluster
+def select_dispersed_representatives(cluster, alpha):
+    num_points = len(cluster)
+    num_representatives = max(int(num_points * alpha), 1)
+    return cluster[np.linspace(0, num_points - 1, num_representatives, dtype=int)]
+
+# Move representatives towards centroid
+def move_representatives_towards_centroid(representatives, centroid, alpha):
+    return centroid + alpha * (representatives - centroid)
+
+# Pass 2: Assigning points to the cluster of their closest representative.
+# 'chunked' compares chunk_size rows at a time with every representative, so
+# memory stays at chunk_size x representatives; 'kdtree' queries a KD-tree
+# over the representatives, which wins when there are many of them.
+def pass_two(data, representatives, representative_clusters, method='chunked', chunk_size=DEFAULT_CHUNK_SIZE):
+    if method == 'kdtree':
+        nearest = cKDTree(representatives).query(data)[1]
+    elif method == 'chunked':
+        nearest = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            nearest[start:start + len(chunk)] = np.argmin(cdist(chunk, representatives, 'sqeuclidean'), axis=1)
+    else:
+        raise ValueError(f"unknown method {method!r}")
+    return representative_clusters[nearest]
+
+# CURE Clustering Algorithm
+def cure_clustering(data, k, sample_size, alpha, seed=None, method='chunked'):
+    initial_clusters, representatives = pass_one(data, sample_size, k, alpha, seed)
+
+    # Concatenate representatives for pass two, remembering their cluster
+    all_representatives = np.vstack(representatives)
+    representative_clusters = np.repeat(np.arange(len(representatives)),
+                                        [len(cluster) for cluster in representatives])
+
+    # Assign points to clusters using representatives
+    labels = pass_two(data, all_representatives, representative_clusters, method)
+
+    return representatives, labels
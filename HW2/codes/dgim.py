@@ -0,0 +1,347 @@
+from array import array
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def as_bits(chunk, packed=False):
+    # A chunk of the stream as a uint8 array of 0/1 values. Accepts '0'/'1'
+    # text (str or bytes), packed bytes (packed=True, most significant bit
+    # first), a bitarray, or any sequence of 0/1 numbers.
+    if hasattr(chunk, 'unpack'):
+        return np.frombuffer(chunk.unpack(), dtype=np.uint8)
+    if isinstance(chunk, str):
+        chunk = chunk.encode('ascii')
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        raw = np.frombuffer(chunk, dtype=np.uint8)
+        if packed:
+            return np.unpackbits(raw)
+        return (raw == ord('1')).astype(np.uint8)
+    return (np.asarray(chunk) != 0).astype(np.uint8)
+
+
+def error_bound(r):
+    # Worst relative error of a DGIM estimate. The oldest bucket counted,
+    # of size 2^j, is taken as half (rounded up) and every smaller size has
+    # at least r - 1 buckets. Undercounting by 2^(j-1) is worst at j = 1,
+    # 1 / (r + 1); overcounting by 2^(j-1) - 1 approaches 1 / (2 * (r - 1))
+    # as j grows. The second dominates only for r <= 3, so 1 / (2 * (r - 1))
+    # is not a bound for r >= 4 (r = 4 with five 1s estimates 4).
+    return max(1 / (r + 1), 1 / (2 * (r - 1)))
+
+
+class DGIM:
+    # Count of 1s in the last window_size bits. Buckets live in one deque per
+    # size 2^i (newest on the left) and store only the timestamp of their
+    # most recent 1, modulo window_size. Each size keeps at most r buckets;
+    # when r + 1 exist the two oldest merge into one of the next size. Every
+    # size below the largest then holds at least r - 1 buckets, so the
+    # estimate is off by at most error_bound(r) of the true count (50% for
+    # the classic r = 2), with O(r log N) buckets of O(log N) bits each.
+    def __init__(self, window_size, r=2):
+        if r < 2:
+            raise ValueError("r must be at least 2")
+        self.window_size = window_size
+        self.r = r
+        self.levels = []
+        self.total = 0
+        self.current_time = window_size - 1
+        self.started = False
+
+    def age(self, timestamp):
+        return (self.current_time - timestamp) % self.window_size
+
+    def advance(self, steps):
+        # Move the clock forward, first dropping every bucket that will have
+        # left the window; ages stay below window_size, so they are never
+        # ambiguous modulo window_size
+        if steps >= self.window_size:
+            self.levels = []
+            self.total = 0
+        else:
+            while self.levels:
+                oldest = self.levels[-1]
+                if self.age(oldest[-1]) + steps < self.window_size:
+                    break
+                oldest.pop()
+                self.total -= 1 << (len(self.levels) - 1)
+                if not oldest:
+                    self.levels.pop()
+        self.current_time = (self.current_time + steps) % self.window_size
+
+    def add_one(self):
+        self.total += 1
+        timestamp = self.current_time
+        size = 0
+        while True:
+            if size == len(self.levels):
+                self.levels.append(deque())
+            level = self.levels[size]
+            level.appendleft(timestamp)
+            if len(level) <= self.r:
+                break
+            # Merge the two oldest; the merged bucket keeps the newer timestamp
+            level.pop()
+            timestamp = level.pop()
+            size += 1
+
+    def update(self, value):
+        self.advance(1)
+        if value:
+            self.add_one()
+
+    def update_many(self, chunk, packed=False):
+        # Runs of 0s are skipped with one advance() each, so only the 1s are
+        # handled in Python
+        bits = as_bits(chunk, packed)
+        if not len(bits):
+            return
+        previous = -1
+        for position in np.flatnonzero(bits).tolist():
+            self.advance(position - previous)
+            self.add_one()
+            previous = position
+        self.advance(len(bits) - 1 - previous)
+
+    def oldest_bucket_size(self):
+        return 1 << (len(self.levels) - 1) if self.levels else 0
+
+    def estimate_sum(self, k=None):
+        # 1s in the last k <= window_size bits, from the same buckets: those
+        # whose newest 1 is within k bits count in full, except the oldest of
+        # them, which counts half (rounded up, as its newest 1 is inside).
+        # The full window is O(1) from the running total.
+        if k is None or k >= self.window_size:
+            oldest = self.oldest_bucket_size()
+            return self.total - oldest // 2
+        total = last = 0
+        for size, level in enumerate(self.levels):
+            for timestamp in level:
+                if self.age(timestamp) >= k:
+                    return total - last // 2
+                last = 1 << size
+                total += last
+        return total - last // 2
+
+
+class DGIMStreams:
+    # Many keyed DGIM counters sharing one window size and r, stored in flat
+    # arrays instead of one object per stream. Values are integers below
+    # 2 ** value_bits; each bit position is its own DGIM row and a window sum
+    # is the sum of the rows' estimates scaled by their place value, which
+    # keeps the error_bound(r) relative error of a single DGIM row.
+    #
+    # Row layout: each row has num_levels levels (bucket sizes 1, 2, 4, ...),
+    # each with r + 1 timestamp slots (newest first) and a bucket count, plus
+    # its clock, running total and number of non-empty levels. A row costs
+    # about 4 * num_levels * (r + 1) bytes; N = 10^6, r = 2 is under 300.
+    def __init__(self, window_size, r=2, value_bits=1):
+        if r < 2:
+            raise ValueError("r must be at least 2")
+        self.window_size = window_size
+        self.r = r
+        self.value_bits = value_bits
+        # A bucket never holds more than window_size 1s
+        self.num_levels = window_size.bit_length()
+        self.slots = r + 1
+        self.rows = {}
+        self.stamps = array('i')
+        self.counts = array('B')
+        self.clocks = array('i')
+        self.totals = array('q')
+        self.tops = array('B')
+        self.empty_counts = array('B', bytes(self.num_levels))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def keys(self):
+        return self.rows.keys()
+
+    def nbytes(self):
+        return sum(values.itemsize * len(values)
+                   for values in (self.stamps, self.counts, self.clocks, self.totals, self.tops))
+
+    def row(self, key):
+        # First row of key's value_bits rows, allocated on first use
+        first = self.rows.get(key)
+        if first is None:
+            first = self.rows[key] = len(self.clocks)
+            width = self.value_bits
+            self.stamps.frombytes(bytes(self.stamps.itemsize * width * self.num_levels * self.slots))
+            self.counts.frombytes(bytes(width * self.num_levels))
+            self.clocks.extend([self.window_size - 1] * width)
+            self.totals.extend([0] * width)
+            self.tops.extend([0] * width)
+        return first
+
+    def advance(self, row, steps):
+        # Same as DGIM.advance, on one row
+        n = self.window_size
+        clock = self.clocks[row]
+        if steps >= n:
+            start = row * self.num_levels
+            self.counts[start:start + self.num_levels] = self.empty_counts
+            self.totals[row] = 0
+            self.tops[row] = 0
+        else:
+            stamps, counts = self.stamps, self.counts
+            top = self.tops[row]
+            while top:
+                level = row * self.num_levels + top - 1
+                count = counts[level]
+                if (clock - stamps[level * self.slots + count - 1]) % n + steps < n:
+                    break
+                counts[level] = count - 1
+                self.totals[row] -= 1 << (top - 1)
+                if count == 1:
+                    top -= 1
+            self.tops[row] = top
+        self.clocks[row] = (clock + steps) % n
+
+    def add_one(self, row):
+        # Same as DGIM.add_one, with the extra slot of each level holding the
+        # r + 1st bucket until the two oldest are merged
+        stamps, counts, slots = self.stamps, self.counts, self.slots
+        self.totals[row] += 1
+        timestamp = self.clocks[row]
+        size = 0
+        while True:
+            level = row * self.num_levels + size
+            start = level * slots
+            count = counts[level]
+            stamps[start + 1:start + count + 1] = stamps[start:start + count]
+            stamps[start] = timestamp
+            if count < self.r:
+                counts[level] = count + 1
+                break
+            timestamp = stamps[start + count - 1]
+            counts[level] = count - 1
+            size += 1
+        if size >= self.tops[row]:
+            self.tops[row] = size + 1
+
+    def update(self, key, value):
+        if not 0 <= value < 1 << self.value_bits:
+            raise ValueError(f"value {value} does not fit in {self.value_bits} bits")
+        first = self.row(key)
+        for bit in range(self.value_bits):
+            self.advance(first + bit, 1)
+            if value >> bit & 1:
+                self.add_one(first + bit)
+
+    def update_many(self, key, values, packed=False):
+        # values is a chunk as accepted by as_bits when value_bits is 1, or
+        # else a sequence of integers
+        first = self.row(key)
+        if self.value_bits == 1:
+            planes = [as_bits(values, packed)]
+        else:
+            values = np.asarray(values, dtype=np.int64)
+            if len(values) and (values.min() < 0 or values.max() >> self.value_bits):
+                raise ValueError(f"values do not fit in {self.value_bits} bits")
+            planes = [(values >> bit) & 1 for bit in range(self.value_bits)]
+        for bit, plane in enumerate(planes):
+            if not len(plane):
+                continue
+            row = first + bit
+            previous = -1
+            for position in np.flatnonzero(plane).tolist():
+                self.advance(row, position - previous)
+                self.add_one(row)
+                previous = position
+            self.advance(row, len(plane) - 1 - previous)
+
+    def estimate_row(self, row, k=None):
+        total = self.totals[row]
+        top = self.tops[row]
+        if k is None or k >= self.window_size:
+            oldest = 1 << (top - 1) if top else 0
+            return total - oldest // 2
+        stamps, counts, slots = self.stamps, self.counts, self.slots
+        clock, n = self.clocks[row], self.window_size
+        total = last = 0
+        for size in range(top):
+            level = row * self.num_levels + size
+            for slot in range(level * slots, level * slots + counts[level]):
+                if (clock - stamps[slot]) % n >= k:
+                    return total - last // 2
+                last = 1 << size
+                total += last
+        return total - last // 2
+
+    def estimate(self, key, k=None):
+        # Sum of the last k <= window_size values of key's stream
+        first = self.rows.get(key)
+        if first is None:
+            return 0
+        return sum(self.estimate_row(first + bit, k) << bit for bit in range(self.value_bits))
+
+    def estimates(self, k=None):
+        return {key: self.estimate(key, k) for key in self.rows}
+
+
+def generate_binary_stream(num_zeros, num_ones, seed=None):
+    stream = np.array([0] * num_zeros + [1] * num_ones)
+    np.random.default_rng(seed).shuffle(stream)
+    return ''.join(map(str, stream))
+
+def exact_window_sums(values, window_sizes, checkpoints):
+    # Exact sum of the last k values at every checkpoint, from prefix sums
+    prefix = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    ends = np.asarray(checkpoints) + 1
+    return {k: prefix[ends] - prefix[np.maximum(ends - k, 0)] for k in window_sizes}
+
+def evaluate(streams, window_sizes, r=2, value_bits=1, every=1000):
+    # Feeds every stream ({key: values}, values as accepted by update_many)
+    # into one DGIMStreams sized for the largest window, in chunks of `every`
+    # values, and after each chunk compares the estimate for every window
+    # size with the exact sum. Returns one row per (key, time, window),
+    # with the r the counter ran with, for summarize_errors.
+    counter = DGIMStreams(max(window_sizes), r, value_bits)
+    records = []
+    for key, values in streams.items():
+        values = as_bits(values) if value_bits == 1 else np.asarray(values, dtype=np.int64)
+        checkpoints = list(range(min(every, len(values)) - 1, len(values), every))
+        exact = exact_window_sums(values, window_sizes, checkpoints)
+        start = 0
+        for position, checkpoint in enumerate(checkpoints):
+            counter.update_many(key, values[start:checkpoint + 1])
+            start = checkpoint + 1
+            for k in window_sizes:
+                records.append((key, checkpoint + 1, k, int(exact[k][position]), counter.estimate(key, k)))
+        counter.update_many(key, values[start:])
+    results = pd.DataFrame.from_records(records, columns=['stream', 'time', 'window', 'exact', 'estimate'])
+    results['error'] = results['estimate'] - results['exact']
+    results['relative_error'] = (results['error'].abs() / results['exact']).where(results['exact'] > 0, 0.0)
+    results['r'] = r
+    return results
+
+def summarize_errors(results):
+    # Signed error range and worst relative error per window size, next to
+    # the DGIM bound for the r that evaluate() used and whether it held
+    rs = results['r'].unique()
+    if len(rs) > 1:
+        raise ValueError(f"results mix runs with r = {sorted(rs.tolist())}; summarize each on its own")
+    summary = results.groupby('window').agg(
+        min_error=('error', 'min'),
+        max_error=('error', 'max'),
+        mean_relative_error=('relative_error', 'mean'),
+        max_relative_error=('relative_error', 'max'),
+    )
+    summary['bound'] = error_bound(int(rs[0])) if len(rs) else np.nan
+    # A hair of slack for floating point on errors exactly at the bound
+    summary['within_bound'] = summary['max_relative_error'] <= summary['bound'] + 1e-12
+    return summary
+
+def check_errors(summary):
+    # Raises if any window's worst relative error exceeded the bound
+    exceeded = summary[~summary['within_bound']]
+    if len(exceeded):
+        raise AssertionError(f"DGIM error above the bound for windows {exceeded.index.tolist()}: "
+                             f"{exceeded['max_relative_error'].tolist()} > {exceeded['bound'].iloc[0]}")
+    return summary
@@ -0,0 +1,293 @@
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import warnings
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from bfr import FEATURES, grouped_sums, read_chunks
+
+
+# Work done on one partition of the points. Every function gets the
+# partition as an (n, d) block plus the partition's index, and returns
+# something of size O(k * d) or smaller, so that is all that crosses the
+# shuffle.
+
+def block_stats(block, index, centroids):
+    # Map-side combine: per-cluster sum vector, count and cost (sum of
+    # squared distances)
+    distances = cdist(block, centroids, 'sqeuclidean')
+    labels = np.argmin(distances, axis=1)
+    return (grouped_sums(labels, block, len(centroids)),
+            np.bincount(labels, minlength=len(centroids)),
+            np.bincount(labels, weights=distances[np.arange(len(block)), labels], minlength=len(centroids)))
+
+def keyed_stats(block, centroids):
+    sums, counts, costs = block_stats(block, 0, centroids)
+    return [(cluster, (sums[cluster], int(counts[cluster]), costs[cluster]))
+            for cluster in range(len(centroids))]
+
+def add_stats(stats, other):
+    return stats[0] + other[0], stats[1] + other[1], stats[2] + other[2]
+
+def block_cost(block, index, centroids):
+    return cdist(block, centroids, 'sqeuclidean').min(axis=1).sum()
+
+def block_sample(block, index, centroids, oversampling, cost, seed):
+    # k-means|| round: each point is picked independently with probability
+    # oversampling * d^2(x, C) / cost
+    rng = np.random.default_rng([seed, index])
+    distances = cdist(block, centroids, 'sqeuclidean').min(axis=1)
+    return block[rng.random(len(block)) < oversampling * distances / cost]
+
+def block_weights(block, index, candidates):
+    labels = np.argmin(cdist(block, candidates, 'sqeuclidean'), axis=1)
+    return np.bincount(labels, minlength=len(candidates))
+
+
+def parse_line(line, indices):
+    row = next(csv.reader([line]))
+    return [float(row[index]) for index in indices]
+
+def parse_block(lines, indices, header):
+    # One partition of raw lines to one float block; the header line (found
+    # in the first partition) is dropped
+    rows = [parse_line(line, indices) for line in lines if line and line != header]
+    yield np.asarray(rows, dtype=np.float64).reshape(len(rows), len(indices))
+
+
+class SparkBackend:
+    # Points live in a cached RDD with one (n, d) block per partition.
+    # Centroids are broadcast, and each partition emits one
+    # (cluster, (sum vector, count, cost)) pair per cluster to reduceByKey.
+    def __init__(self, sc, file_path, columns=FEATURES, num_partitions=None):
+        self.sc = sc
+        lines = sc.textFile(file_path, num_partitions) if num_partitions else sc.textFile(file_path)
+        header = lines.first()
+        names = next(csv.reader([header]))
+        indices = [names.index(column) for column in columns]
+        self.blocks = lines.mapPartitions(lambda partition: parse_block(partition, indices, header)).cache()
+        self.block_sizes = self.blocks.map(len).collect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.blocks.unpersist()
+
+    def map_blocks(self, function, *args):
+        shared = self.sc.broadcast(args)
+        results = self.blocks.mapPartitionsWithIndex(
+            lambda index, blocks: [function(block, index, *shared.value) for block in blocks]).collect()
+        shared.unpersist()
+        return results
+
+    def cluster_stats(self, centroids):
+        shared = self.sc.broadcast(centroids)
+        stats = self.blocks.flatMap(lambda block: keyed_stats(block, shared.value)) \
+            .reduceByKey(add_stats).collectAsMap()
+        shared.unpersist()
+        sums = np.array([stats[cluster][0] for cluster in range(len(centroids))])
+        counts = np.array([stats[cluster][1] for cluster in range(len(centroids))])
+        return sums, counts, sum(value[2] for value in stats.values())
+
+    def points(self, indices):
+        # The rows at the given global indices, in that order, from a single
+        # job: every partition returns just its own selected rows
+        blocks, rows = locate_rows(self.block_sizes, indices)
+        wanted = {int(block): rows[blocks == block] for block in np.unique(blocks)}
+        selected = self.map_blocks(block_rows, wanted)
+        result = np.empty((len(rows), selected[0].shape[1]))
+        for block in wanted:
+            result[blocks == block] = selected[block]
+        return result
+
+
+def locate_rows(block_sizes, indices):
+    # (block, row within the block) of every global row index
+    indices = np.asarray(indices, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(block_sizes)))
+    if len(indices) and (indices.min() < 0 or indices.max() >= starts[-1]):
+        raise IndexError(indices)
+    blocks = np.searchsorted(starts, indices, side='right') - 1
+    return blocks, indices - starts[blocks]
+
+def block_rows(block, index, wanted):
+    return block[wanted.get(index, np.zeros(0, dtype=np.int64))]
+
+
+# Process-local view of the points file, opened once per pool worker
+worker_points = None
+
+def open_points(path, dimensions):
+    global worker_points
+    worker_points = np.memmap(path, dtype=np.float64, mode='r').reshape(-1, dimensions)
+
+def run_block(task):
+    function, index, start, end, args = task
+    return function(np.asarray(worker_points[start:end]), index, *args)
+
+
+class PoolBackend:
+    # Pure-Python fallback: the features are parsed once, chunk by chunk, into
+    # a flat float64 file that every worker memory-maps, so a task only
+    # carries its row range and the centroids, and returns O(k * d) partials
+    def __init__(self, file_path, columns=FEATURES, workers=None, num_partitions=None, chunk_size=10000):
+        self.workers = workers or os.cpu_count() or 1
+        self.tmp = tempfile.mkdtemp(prefix='kmeans-')
+        self.path = os.path.join(self.tmp, 'points.f64')
+        self.dimensions = len(columns)
+        size = 0
+        with open(self.path, 'wb') as file:
+            for chunk in read_chunks(file_path, columns, chunk_size):
+                file.write(np.ascontiguousarray(chunk).tobytes())
+                size += len(chunk)
+        num_partitions = num_partitions or 4 * self.workers
+        step = max(1, -(-size // num_partitions))
+        self.ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+        self.block_sizes = [end - start for start, end in self.ranges]
+        open_points(self.path, self.dimensions)
+        self.pool = Pool(self.workers, initializer=open_points, initargs=(self.path, self.dimensions))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def map_blocks(self, function, *args):
+        tasks = [(function, index, start, end, args) for index, (start, end) in enumerate(self.ranges)]
+        return self.pool.map(run_block, tasks)
+
+    def cluster_stats(self, centroids):
+        sums, counts, costs = 0, 0, 0
+        for block_sums, block_counts, block_costs in self.map_blocks(block_stats, centroids):
+            sums, counts, costs = sums + block_sums, counts + block_counts, costs + block_costs
+        return sums, counts, costs.sum()
+
+    def points(self, indices):
+        return np.asarray(worker_points[np.asarray(indices, dtype=np.int64)])
+
+
+def weighted_kmeans_plus_plus(candidates, weights, k, rng, max_iterations=20):
+    # Reduces the k-means|| candidates to k centroids on the driver:
+    # k-means++ seeding on the weighted candidates, then weighted Lloyd steps
+    weights = np.asarray(weights, dtype=np.float64)
+    chosen = [rng.choice(len(candidates), p=weights / weights.sum())]
+    distances = cdist(candidates, candidates[chosen], 'sqeuclidean')[:, 0]
+    while len(chosen) < k:
+        scores = weights * distances
+        if scores.sum() <= 0:
+            break
+        chosen.append(rng.choice(len(candidates), p=scores / scores.sum()))
+        distances = np.minimum(distances, cdist(candidates, candidates[chosen[-1:]], 'sqeuclidean')[:, 0])
+    centroids = candidates[chosen]
+    for _ in range(max_iterations):
+        labels = np.argmin(cdist(candidates, centroids, 'sqeuclidean'), axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=len(centroids))
+        sums = grouped_sums(labels, candidates * weights[:, np.newaxis], len(centroids))
+        new_centroids = np.where(totals[:, np.newaxis] > 0, sums / np.maximum(totals, 1e-12)[:, np.newaxis], centroids)
+        if np.allclose(centroids, new_centroids):
+            break
+        centroids = new_centroids
+    return centroids
+
+def kmeans_parallel_init(backend, k, oversampling=None, rounds=5, seed=42):
+    # k-means|| (Bahmani et al.): a few passes that each sample about
+    # oversampling points in proportion to their cost, then the weighted
+    # candidates are clustered down to k on the driver
+    rng = np.random.default_rng(seed)
+    oversampling = oversampling or 2 * k
+    first = int(rng.integers(sum(backend.block_sizes)))
+    candidates = backend.points([first])
+    for round_number in range(rounds):
+        cost = sum(backend.map_blocks(block_cost, candidates))
+        if cost <= 0:
+            break
+        sampled = backend.map_blocks(block_sample, candidates, oversampling, cost, seed + round_number)
+        candidates = np.vstack([candidates] + [block for block in sampled if len(block)])
+    candidates = np.unique(candidates, axis=0)
+    if len(candidates) <= k:
+        return candidates
+    weights = sum(backend.map_blocks(block_weights, candidates))
+    return weighted_kmeans_plus_plus(candidates, weights, k, rng)
+
+def random_init(backend, k, seed=42):
+    rng = np.random.default_rng(seed)
+    indices = rng.choice(sum(backend.block_sizes), size=k, replace=False)
+    return backend.points(indices)
+
+def partitioned_kmeans(backend, k, max_iterations=20, tolerance=1e-4, init='k-means||', seed=42):
+    # Lloyd iterations where each pass ships only per-partition (sum, count)
+    # partials. Returns the centroids, the final cost and the iteration count.
+    if init == 'k-means||':
+        centroids = kmeans_parallel_init(backend, k, seed=seed)
+    elif init == 'random':
+        centroids = random_init(backend, k, seed)
+    else:
+        raise ValueError(f"unknown init {init!r}")
+    cost = None
+    for iteration in range(1, max_iterations + 1):
+        sums, counts, cost = backend.cluster_stats(centroids)
+        new_centroids = update_centroids_from_stats(sums, counts, centroids)
+        shift = np.abs(new_centroids - centroids).max()
+        centroids = new_centroids
+        if shift <= tolerance:
+            break
+    return centroids, cost, iteration
+
+def update_centroids_from_stats(sums, counts, centroids):
+    # Same rule as update_centroids, from the reduced partials
+    return np.where(np.asarray(counts)[:, np.newaxis] > 0,
+                    sums / np.maximum(counts, 1)[:, np.newaxis], centroids)
+
+
+def spark_context(app_name='KMeans', master='local[*]'):
+    from pyspark import SparkConf, SparkContext
+    conf = SparkConf().setAppName(app_name).setMaster(master)
+    return SparkContext.getOrCreate(conf=conf)
+
+def open_backend(file_path, backend='auto', workers=None, num_partitions=None, columns=FEATURES):
+    # 'spark' needs pyspark and a working JVM; 'auto' falls back to the
+    # process pool when either is missing (a broken Java gateway raises
+    # something other than ImportError)
+    if backend in ('spark', 'auto'):
+        try:
+            sc = spark_context()
+        except Exception as error:
+            if backend == 'spark':
+                raise
+            warnings.warn(f"Spark unavailable ({type(error).__name__}: {error}), using the process pool")
+        else:
+            return SparkBackend(sc, file_path, columns, num_partitions)
+    return PoolBackend(file_path, columns, workers, num_partitions)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Partitioned k-means over songs.csv")
+    parser.add_argument('input_file', nargs='?', default='songs.csv')
+    parser.add_argument('--k', type=int, default=15)
+    parser.add_argument('--backend', choices=['auto', 'spark', 'pool'], default='auto')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--partitions', type=int, default=None)
+    parser.add_argument('--init', choices=['k-means||', 'random'], default='k-means||')
+    parser.add_argument('--max-iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    with open_backend(args.input_file, args.backend, args.workers, args.partitions) as backend:
+        centroids, cost, iterations = partitioned_kmeans(backend, args.k, args.max_iterations, init=args.init)
+    print(f"Converged after {iterations} iterations, cost {cost:.4f}")
+    print("Final centroids:")
+    print(centroids)
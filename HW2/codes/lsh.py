@@ -0,0 +1,104 @@
+import pickle
+from collections import Counter
+
+import numpy as np
+
+from minhash import signature_similarity
+
+
+class LSHIndex:
+    # Banded LSH over minhash signatures: the signature is cut into `bands`
+    # slices and each slice is a key in that band's bucket dictionary, so the
+    # candidates of a query are read from `bands` buckets instead of being
+    # found by comparing against every customer
+    def __init__(self, bands, rows):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+        # Insertion order, used to break similarity ties like the notebook did
+        self.order = {}
+        self.next_order = 0
+
+    def band_keys(self, signature):
+        signature = np.ascontiguousarray(signature, dtype=np.int64)
+        if len(signature) != self.bands * self.rows:
+            raise ValueError(f"signature length {len(signature)} is not {self.bands} bands x {self.rows} rows")
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def insert(self, key, signature):
+        if key in self.signatures:
+            self.delete(key)
+        signature = np.asarray(signature, dtype=np.int64)
+        for buckets, band_key in zip(self.buckets, self.band_keys(signature)):
+            buckets.setdefault(band_key, set()).add(key)
+        self.signatures[key] = signature
+        self.order[key] = self.next_order
+        self.next_order += 1
+
+    def insert_many(self, signatures):
+        # signatures is a {key: signature} mapping or a DataFrame indexed by
+        # key, whose rows are taken from one NumPy array rather than a Series
+        # per row
+        if hasattr(signatures, 'to_numpy'):
+            items = zip(signatures.index.tolist(), signatures.to_numpy())
+        else:
+            items = signatures.items()
+        for key, signature in items:
+            self.insert(key, np.asarray(signature))
+
+    def delete(self, key):
+        signature = self.signatures.pop(key)
+        del self.order[key]
+        for buckets, band_key in zip(self.buckets, self.band_keys(signature)):
+            bucket = buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[band_key]
+
+    def candidates(self, signature):
+        found = set()
+        for buckets, band_key in zip(self.buckets, self.band_keys(signature)):
+            found.update(buckets.get(band_key, ()))
+        return found
+
+    def query(self, key, top_n=None):
+        # Customers sharing at least one band with `key`, most similar first
+        signature = self.signatures[key]
+        similarities = [(other, signature_similarity(signature, self.signatures[other]))
+                        for other in self.candidates(signature) if other != key]
+        similarities.sort(key=lambda x: (-x[1], self.order[x[0]]))
+        return similarities[:top_n] if top_n is not None else similarities
+
+    def query_many(self, keys, top_n=None):
+        return {key: self.query(key, top_n) for key in keys}
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+
+def suggest_products(desired_customer_ids, index, products_data, num_similar=10, num_top_products=3):
+    # Same report as the notebook, but each customer is looked up once and
+    # the similar customers are returned with the suggestions
+    suggested_products = {}
+    for desired_customer_id, similarities in index.query_many(desired_customer_ids, num_similar).items():
+        similar_customers = [customer_id for customer_id, _ in similarities]
+        product_counts = Counter()
+        product_source = {}
+        for customer_id in similar_customers:
+            for product in products_data.get(customer_id, []):
+                product_counts[product] += 1
+                product_source.setdefault(product, []).append(customer_id)
+        top_products = [product for product, _ in product_counts.most_common(num_top_products)]
+        suggested_products[desired_customer_id] = {
+            "similar": similarities,
+            "products": top_products,
+            "sources": {product: product_source[product] for product in top_products},
+        }
+    return suggested_products
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# Mersenne prime 2^31 - 1: a * x + b stays below 2^62, so int64 never overflows
+PRIME = (1 << 31) - 1
+
+
+def shingle(text: str, k: int):
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+def customer_documents(data, customer_id_column='customer_id', object_name_column='object_name'):
+    # Same text per customer as the notebook (sorted distinct object names
+    # joined by spaces), built with a groupby instead of iterrows
+    names = data[[customer_id_column, object_name_column]].drop_duplicates()
+    return names.groupby(customer_id_column, sort=False)[object_name_column].agg(
+        lambda object_names: ' '.join(sorted(object_names)))
+
+def shingle_matrix(documents, k):
+    # Sparse customer x shingle matrix in CSR form: row i holds the column
+    # ids of the shingles of documents.iloc[i]. No dense 0/1 vector is built.
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    for text in documents:
+        columns = {vocabulary.setdefault(s, len(vocabulary)) for s in shingle(text, k)}
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+    matrix = csr_matrix((np.ones(len(indices), dtype=np.uint8),
+                         np.asarray(indices, dtype=np.int64),
+                         np.asarray(indptr, dtype=np.int64)),
+                        shape=(len(documents), len(vocabulary)))
+    return matrix, vocabulary
+
+def build_minhash_func(n, seed=None):
+    # Universal hashes h(x) = (a * x + b) mod p instead of stored permutations
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, size=n, dtype=np.int64)
+    b = rng.integers(0, PRIME, size=n, dtype=np.int64)
+    return a, b
+
+def minhash_signatures(matrix, hash_funcs, chunk_nnz=1 << 20):
+    # Signature of every row in one pass: hash all the row's column ids with
+    # every function and take the minimum per row with np.minimum.reduceat.
+    # Rows are processed in chunks of about chunk_nnz non-zeros to bound the
+    # (n_hashes x nnz) intermediate. Empty rows get the signature PRIME.
+    a, b = hash_funcs
+    indptr, indices = matrix.indptr, matrix.indices.astype(np.int64)
+    n_rows = matrix.shape[0]
+    signatures = np.full((n_rows, len(a)), PRIME, dtype=np.int64)
+    start_row = 0
+    while start_row < n_rows:
+        end_row = start_row + 1
+        while end_row < n_rows and indptr[end_row + 1] - indptr[start_row] <= chunk_nnz:
+            end_row += 1
+        lo, hi = indptr[start_row], indptr[end_row]
+        if hi > lo:
+            hashed = (a[:, None] * indices[None, lo:hi] + b[:, None]) % PRIME
+            starts = indptr[start_row:end_row] - lo
+            non_empty = indptr[start_row + 1:end_row + 1] > indptr[start_row:end_row]
+            minima = np.minimum.reduceat(hashed, starts[non_empty], axis=1)
+            signatures[start_row:end_row][non_empty] = minima.T
+        start_row = end_row
+    return signatures
+
+def signature_similarity(signature1, signature2):
+    # Fraction of agreeing minhashes: an unbiased estimate of the Jaccard
+    # similarity of the two shingle sets
+    return np.mean(np.asarray(signature1) == np.asarray(signature2))
+
+def customer_signatures(data, k=2, num_hashes=50, seed=None):
+    # {customer_id: signature row} for the purchase records in data
+    documents = customer_documents(data)
+    matrix, vocabulary = shingle_matrix(documents, k)
+    signatures = minhash_signatures(matrix, build_minhash_func(num_hashes, seed))
+    return pd.DataFrame(signatures, index=documents.index)
@@ -0,0 +1,181 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, diags, vstack
+
+# A user x item rating matrix in CSR form; row i is user_ids[i] and column j
+# is item_ids[j], both sorted like the rows and columns of ratings.pivot
+Ratings = namedtuple('Ratings', ['matrix', 'user_ids', 'item_ids'])
+
+# Rows of similarities computed at once when building a full top-N matrix
+DEFAULT_CHUNK_SIZE = 1024
+
+# Neighbours kept per item by ItemItemCF; the full item x item matrix grows
+# with the square of the catalogue, so keeping all of them is opt-in
+DEFAULT_TOP_N = 50
+
+
+def build_ratings(ratings, user_column='userId', item_column='movieId', rating_column='rating'):
+    # A user re-rating an item appends a row, so the last row for a (user,
+    # item) wins, as in HybridRecommender.add_ratings
+    ratings = ratings.drop_duplicates([user_column, item_column], keep='last')
+    user_ids, users = np.unique(ratings[user_column].to_numpy(), return_inverse=True)
+    item_ids, items = np.unique(ratings[item_column].to_numpy(), return_inverse=True)
+    matrix = csr_matrix((ratings[rating_column].to_numpy(dtype=np.float64), (users, items)),
+                        shape=(len(user_ids), len(item_ids)))
+    matrix.sum_duplicates()
+    return Ratings(matrix, user_ids, item_ids)
+
+def row_means(matrix):
+    counts = np.diff(matrix.indptr)
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    return np.divide(sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+
+def centre_rows(matrix):
+    # Subtracts each row's mean from its stored ratings only; missing entries
+    # stay missing rather than becoming -mean
+    centred = matrix.copy()
+    centred.data -= np.repeat(row_means(matrix), np.diff(matrix.indptr))
+    return centred
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros(len(norms)), where=norms > 0)
+    return (diags(scale) @ matrix).tocsr()
+
+def similarity_rows(matrix, method='pearson'):
+    # Rows scaled so that similarities are plain dot products: cosine of the
+    # raw ratings, or cosine of the mean-centred ratings for 'pearson' (each
+    # row centred on the mean of all its ratings, not of the co-rated ones)
+    if method == 'pearson':
+        matrix = centre_rows(matrix)
+    elif method != 'cosine':
+        raise ValueError(f"unknown method {method!r}")
+    return normalize_rows(matrix)
+
+def keep_top(similarities, top_n):
+    # Keeps the top_n largest entries of every row of a dense block
+    if top_n is None or top_n >= similarities.shape[1]:
+        return similarities
+    cut = np.argpartition(-similarities, top_n - 1, axis=1)[:, :top_n]
+    kept = np.zeros_like(similarities)
+    rows = np.arange(len(similarities))[:, np.newaxis]
+    kept[rows, cut] = similarities[rows, cut]
+    return kept
+
+def similarity_matrix(normalized, top_n=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # All pairwise similarities of the rows of a similarity_rows() matrix,
+    # chunk_size rows at a time, without the diagonal and keeping only the
+    # top_n neighbours of each row, as a sparse matrix
+    transposed = normalized.T.tocsc()
+    blocks = []
+    for start in range(0, normalized.shape[0], chunk_size):
+        block = (normalized[start:start + chunk_size] @ transposed).toarray()
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf
+        block = keep_top(block, top_n)
+        block[rows, start + rows] = 0
+        block[~np.isfinite(block)] = 0
+        blocks.append(csr_matrix(block))
+    if not blocks:
+        return csr_matrix((normalized.shape[0], normalized.shape[0]))
+    return vstack(blocks).tocsr()
+
+def indicator(matrix):
+    rated = matrix.copy()
+    rated.data = np.ones_like(rated.data)
+    return rated
+
+def top_predictions(predictions, item_ids, top_n):
+    # The top_n finite predictions as a Series indexed by item id, ordered
+    # like Series.nlargest
+    valid = np.flatnonzero(np.isfinite(predictions))
+    return pd.Series(predictions[valid], index=item_ids[valid]).nlargest(top_n)
+
+
+class UserUserCF:
+    # User-user CF: similarities of one user to all others are one sparse
+    # matrix-vector product, and the scores of every item are one product of
+    # the neighbours' weights with their rating rows
+    def __init__(self, ratings, method='pearson'):
+        self.ratings = ratings
+        self.user_index = {user_id: row for row, user_id in enumerate(ratings.user_ids.tolist())}
+        self.normalized = similarity_rows(ratings.matrix, method)
+        self.rated = indicator(ratings.matrix)
+
+    def similarities(self, user_id):
+        row = self.user_index[user_id]
+        similarities = (self.normalized @ self.normalized[row].T).toarray().ravel()
+        similarities[row] = -np.inf
+        return similarities
+
+    def neighbours(self, user_id, num_neighbours=10):
+        # Rows and similarities of the most similar users, most similar first
+        similarities = self.similarities(user_id)
+        num_neighbours = min(num_neighbours, len(similarities) - 1)
+        top = np.argpartition(-similarities, num_neighbours - 1)[:num_neighbours]
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        return top, similarities[top]
+
+    def predict(self, user_id, num_neighbours=10):
+        # Similarity-weighted average of the neighbours' ratings for every
+        # item the user has not rated; NaN where no neighbour rated it
+        rows, weights = self.neighbours(user_id, num_neighbours)
+        numerator = self.ratings.matrix[rows].T @ weights
+        denominator = self.rated[rows].T @ np.abs(weights)
+        predictions = np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+        predictions[self.ratings.matrix[self.user_index[user_id]].indices] = np.nan
+        return predictions
+
+    def recommend(self, user_id, top_n=6, num_neighbours=10):
+        return top_predictions(self.predict(user_id, num_neighbours), self.ratings.item_ids, top_n)
+
+
+def baseline_biases(ratings):
+    # mu, and the user and item biases (mean rating minus mu) per row/column
+    matrix = ratings.matrix
+    mu = matrix.data.mean()
+    user_biases = row_means(matrix) - mu
+    item_biases = row_means(matrix.T.tocsr()) - mu
+    return mu, user_biases, item_biases
+
+
+class ItemItemCF:
+    # Item-item CF over a sparse item x item similarity matrix holding the
+    # top_n neighbours of each item (all of them with top_n=None). For one
+    # user, the scores of all items are a product of that matrix with the
+    # user's rating row.
+    def __init__(self, ratings, method='pearson', top_n=DEFAULT_TOP_N, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.ratings = ratings
+        self.user_index = {user_id: row for row, user_id in enumerate(ratings.user_ids.tolist())}
+        normalized = similarity_rows(ratings.matrix.T.tocsr(), method)
+        self.similarities = similarity_matrix(normalized, top_n, chunk_size)
+        self.absolute = abs(self.similarities)
+        self.mu, self.user_biases, self.item_biases = baseline_biases(ratings)
+
+    def predict(self, user_id, baseline=False):
+        row = self.user_index[user_id]
+        user_ratings = self.ratings.matrix[row]
+        items, values = user_ratings.indices, user_ratings.data
+        if baseline:
+            # Deviations from the baseline mu + b_x + b_j of the rated items,
+            # added back onto the baseline of the predicted item
+            user_baseline = self.mu + self.user_biases[row]
+            values = values - (user_baseline + self.item_biases[items])
+        weights = np.zeros(self.similarities.shape[1])
+        weights[items] = values
+        rated = np.zeros(self.similarities.shape[1])
+        rated[items] = 1
+        numerator = self.similarities @ weights
+        denominator = self.absolute @ rated
+        if baseline:
+            base = user_baseline + self.item_biases
+            predictions = base + np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+        else:
+            predictions = np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+        predictions[items] = np.nan
+        return predictions
+
+    def recommend(self, user_id, top_n=6, baseline=False):
+        return top_predictions(self.predict(user_id, baseline), self.ratings.item_ids, top_n)
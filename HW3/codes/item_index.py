@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from cf import DEFAULT_CHUNK_SIZE, baseline_biases, indicator, similarity_rows, top_predictions
+
+ARRAYS = ['indptr', 'neighbours', 'similarities', 'item_ids', 'item_biases']
+
+
+def neighbourhood_block(similarities, co_ratings, rows, k, min_co_ratings, shrinkage):
+    # Top-k neighbours of a block of items. Pairs with fewer than
+    # min_co_ratings common raters are dropped, and the rest are shrunk
+    # towards 0 by n / (n + shrinkage) so that similarities resting on few
+    # common raters count less.
+    weights = np.divide(co_ratings, co_ratings + shrinkage, out=np.zeros(co_ratings.shape),
+                        where=co_ratings + shrinkage > 0)
+    similarities = similarities * weights
+    similarities[co_ratings < min_co_ratings] = 0
+    similarities[np.arange(len(rows)), rows] = 0
+    k = min(k, similarities.shape[1])
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    top, values = np.take_along_axis(top, order, axis=1), np.take_along_axis(values, order, axis=1)
+    keep = values > 0
+    return top[keep], values[keep], keep.sum(axis=1)
+
+def build_item_index(ratings, k=50, min_co_ratings=2, shrinkage=100.0, method='pearson',
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    # Offline build: item x item similarities and co-rating counts are
+    # computed chunk_size items at a time, so the dense items x items matrix
+    # never exists, and only the k best positive neighbours of each item are
+    # kept, most similar first
+    items = ratings.matrix.T.tocsr()
+    normalized = similarity_rows(items, method)
+    rated = indicator(items)
+    normalized_t, rated_t = normalized.T.tocsc(), rated.T.tocsc()
+    neighbours, similarities, counts = [], [], []
+    for start in range(0, items.shape[0], chunk_size):
+        block = slice(start, start + chunk_size)
+        rows = np.arange(start, min(start + chunk_size, items.shape[0]))
+        top, values, sizes = neighbourhood_block((normalized[block] @ normalized_t).toarray(),
+                                                 (rated[block] @ rated_t).toarray(),
+                                                 rows, k, min_co_ratings, shrinkage)
+        neighbours.append(top)
+        similarities.append(values)
+        counts.append(sizes)
+    indptr = np.concatenate(([0], np.cumsum(np.concatenate(counts))))
+    index_dtype = np.int32 if indptr[-1] < 2 ** 31 else np.int64
+    mu, _, item_biases = baseline_biases(ratings)
+    return ItemNeighbourhoodIndex(
+        indptr.astype(index_dtype),
+        np.concatenate(neighbours).astype(index_dtype),
+        np.concatenate(similarities).astype(np.float32),
+        ratings.item_ids, mu, item_biases,
+        {'k': k, 'min_co_ratings': min_co_ratings, 'shrinkage': shrinkage, 'method': method})
+
+
+class ItemNeighbourhoodIndex:
+    # Item-item CF with baseline, served from precomputed neighbour lists in
+    # CSR arrays: the neighbours of item i are neighbours[indptr[i]:indptr[i + 1]]
+    # with similarities[...] alongside, about k * (4 + 4) bytes per item. For
+    # a user with ratings r_j, every item is scored at once as
+    #   b_xi + sum_j s_ij (r_j - b_xj) / sum_j s_ij
+    # over the rated neighbours j of i, where b_xi = mu + b_x + b_i. Only
+    # positive similarities are kept, so sum_j s_ij is also sum_j |s_ij|.
+    # The sparse matrix wraps the (possibly memory-mapped) arrays without
+    # copying them.
+    def __init__(self, indptr, neighbours, similarities, item_ids, mu, item_biases, options=None):
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.item_ids = np.asarray(item_ids)
+        self.mu = float(mu)
+        self.item_biases = item_biases
+        self.options = options or {}
+        self.item_index = {item_id: column for column, item_id in enumerate(self.item_ids.tolist())}
+        num_items = len(self.item_ids)
+        self.matrix = csr_matrix((similarities, neighbours, indptr), shape=(num_items, num_items))
+
+    def save(self, path):
+        # Written to a temporary directory first so a crashed build never
+        # leaves a half-written index behind
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        try:
+            for name in ARRAYS:
+                np.save(os.path.join(tmp, name + '.npy'), getattr(self, name))
+            with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as file:
+                json.dump({'mu': self.mu, 'options': self.options}, file)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def load(path, mmap=True):
+        # With mmap the arrays stay on disk and pages are read on demand
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mode, allow_pickle=False)
+                  for name in ARRAYS}
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        return ItemNeighbourhoodIndex(arrays['indptr'], arrays['neighbours'], arrays['similarities'],
+                                      arrays['item_ids'], meta['mu'], arrays['item_biases'], meta['options'])
+
+    def neighbours_of(self, item_id):
+        column = self.item_index[item_id]
+        start, end = self.indptr[column], self.indptr[column + 1]
+        return self.item_ids[self.neighbours[start:end]], self.similarities[start:end]
+
+    def user_columns(self, user_ratings):
+        # user_ratings maps item id to rating; items unknown to the index are
+        # skipped
+        columns, values = [], []
+        for item_id, rating in user_ratings.items():
+            column = self.item_index.get(item_id)
+            if column is not None:
+                columns.append(column)
+                values.append(rating)
+        return np.asarray(columns, dtype=np.int64), np.asarray(values, dtype=np.float64)
+
+    def score(self, columns, values):
+        # Baseline predictions for every item from one user's ratings (item
+        # columns and values). b_x is the user's mean rating minus mu, so
+        # users unseen at build time are scored too. Rated items come back NaN.
+        user_baseline = self.mu + (values.mean() - self.mu if len(values) else 0.0)
+        deviations = np.zeros(len(self.item_ids))
+        deviations[columns] = values - (user_baseline + self.item_biases[columns])
+        rated = np.zeros(len(self.item_ids))
+        rated[columns] = 1
+        numerator = self.matrix @ deviations
+        denominator = self.matrix @ rated
+        predictions = user_baseline + self.item_biases + np.divide(
+            numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+        predictions[columns] = np.nan
+        return predictions
+
+    def predict(self, user_ratings):
+        return self.score(*self.user_columns(user_ratings))
+
+    def recommend(self, user_ratings, top_n=6):
+        return top_predictions(self.predict(user_ratings), self.item_ids, top_n)
+
+
+def user_ratings_of(ratings, user_id):
+    # {item id: rating} of one user of a cf.Ratings matrix
+    position = int(np.searchsorted(ratings.user_ids, user_id))
+    if position == len(ratings.user_ids) or ratings.user_ids[position] != user_id:
+        raise KeyError(user_id)
+    row = ratings.matrix[position]
+    return dict(zip(ratings.item_ids[row.indices].tolist(), row.data.tolist()))
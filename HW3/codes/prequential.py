@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR_NAME = '.stream_cache'
+
+# Rows parsed per pandas chunk when the CSV is first converted
+PARSE_CHUNK_SIZE = 200000
+
+# Incremental classifiers by name, imported only when used. Each must offer
+# partial_fit(X, y, classes=...) and predict(X).
+MODELS = {
+    'hoeffding_tree': ('skmultiflow.trees', 'HoeffdingTreeClassifier'),
+    'adaptive_random_forest': ('skmultiflow.meta', 'AdaptiveRandomForestClassifier'),
+    'naive_bayes': ('sklearn.naive_bayes', 'GaussianNB'),
+    'sgd': ('sklearn.linear_model', 'SGDClassifier'),
+}
+
+
+def make_model(name, options=None):
+    module_name, class_name = MODELS[name]
+    return getattr(importlib.import_module(module_name), class_name)(**(options or {}))
+
+
+def stream_cache_path(file_path, cache_dir=None):
+    # Tied to the CSV's size and mtime like the HW1 columnar cache, so a
+    # changed file is parsed again
+    stat = os.stat(file_path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(file_path)}-{stat.st_size}-{stat.st_mtime_ns}-{digest}")
+
+def parse_stream(file_path, path, chunk_size=PARSE_CHUNK_SIZE):
+    # Features (every column but the last) go to a flat float32 file and the
+    # target, encoded as class codes in order of first appearance, to an
+    # int32 file, chunk by chunk, so the whole CSV is never in memory
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    try:
+        classes = {}
+        num_rows = 0
+        num_features = None
+        with open(os.path.join(tmp, 'X.f32'), 'wb') as features, open(os.path.join(tmp, 'y.i32'), 'wb') as targets:
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+                values = chunk.to_numpy()
+                num_features = values.shape[1] - 1
+                features.write(np.ascontiguousarray(values[:, :-1], dtype=np.float32).tobytes())
+                codes = [classes.setdefault(label, len(classes)) for label in values[:, -1].tolist()]
+                targets.write(np.asarray(codes, dtype=np.int32).tobytes())
+                num_rows += len(chunk)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump({'num_rows': num_rows, 'num_features': num_features, 'classes': list(classes)}, file)
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+def open_stream(path):
+    # (X, y, classes) memory-mapped from a parsed stream directory
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+        meta = json.load(file)
+    X = np.memmap(os.path.join(path, 'X.f32'), dtype=np.float32, mode='r',
+                  shape=(meta['num_rows'], meta['num_features']))
+    y = np.memmap(os.path.join(path, 'y.i32'), dtype=np.int32, mode='r', shape=(meta['num_rows'],))
+    return X, y, meta['classes']
+
+def load_stream(file_path, cache_dir=None):
+    # Parses the CSV the first time; later calls, and every worker, only map
+    # the cached arrays. Returns the cache path for open_stream.
+    path = stream_cache_path(file_path, cache_dir)
+    if not os.path.isdir(path):
+        parse_stream(file_path, path)
+    return path
+
+
+def window_metrics(y_true, y_pred, num_classes):
+    # Accuracy and Cohen's kappa of one window, from its confusion matrix
+    confusion = np.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes)
+    confusion = confusion.reshape(num_classes, num_classes)
+    total = confusion.sum()
+    accuracy = np.trace(confusion) / total
+    chance = (confusion.sum(axis=0) * confusion.sum(axis=1)).sum() / (total * total)
+    kappa = (accuracy - chance) / (1 - chance) if chance < 1 else 0.0
+    return accuracy, kappa
+
+def evaluate_model(task):
+    # Prequential (test-then-train) run of one model over the memory-mapped
+    # stream: pretrain on the first pretrain_size samples, then predict each
+    # mini-batch before training on it. Metrics are computed over sliding
+    # windows of window_size samples, reported every `every` samples.
+    name, model_name, options, path, pretrain_size, max_samples, batch_size, window_size, every = task
+    X, y, classes = open_stream(path)
+    num_classes = len(classes)
+    labels = np.arange(num_classes)
+    end = len(y) if max_samples is None else min(max_samples, len(y))
+    pretrain_size = min(pretrain_size, end)
+    model = make_model(model_name, options)
+
+    started = time.perf_counter()
+    for start in range(0, pretrain_size, batch_size):
+        stop = min(start + batch_size, pretrain_size)
+        model.partial_fit(np.asarray(X[start:stop]), np.asarray(y[start:stop]), classes=labels)
+    pretrain_seconds = time.perf_counter() - started
+
+    predictions = np.empty(end - pretrain_size, dtype=np.int64)
+    records = []
+    started = time.perf_counter()
+    next_report = every
+    for start in range(pretrain_size, end, batch_size):
+        stop = min(start + batch_size, end)
+        X_batch, y_batch = np.asarray(X[start:stop]), np.asarray(y[start:stop])
+        predictions[start - pretrain_size:stop - pretrain_size] = model.predict(X_batch)
+        model.partial_fit(X_batch, y_batch, classes=labels)
+        seen = stop - pretrain_size
+        if seen >= next_report or stop == end:
+            window = slice(max(0, seen - window_size), seen)
+            accuracy, kappa = window_metrics(np.asarray(y[pretrain_size:end][window], dtype=np.int64),
+                                             predictions[window], num_classes)
+            elapsed = time.perf_counter() - started
+            records.append((name, stop, accuracy, kappa, seen / elapsed if elapsed > 0 else float('inf')))
+            next_report = seen + every
+    seconds = time.perf_counter() - started
+
+    evaluated = end - pretrain_size
+    if evaluated:
+        accuracy, kappa = window_metrics(np.asarray(y[pretrain_size:end], dtype=np.int64), predictions, num_classes)
+    else:
+        accuracy, kappa = float('nan'), float('nan')
+    summary = {
+        'model': name,
+        'samples': evaluated,
+        'accuracy': accuracy,
+        'kappa': kappa,
+        'pretrain_seconds': pretrain_seconds,
+        'seconds': seconds,
+        'samples_per_second': evaluated / seconds if seconds > 0 else float('inf'),
+    }
+    return summary, records
+
+
+def evaluate_prequential(file_path, models, pretrain_size=2000000, max_samples=4000000, batch_size=1000,
+                         window_size=200, every=None, workers=None, cache_dir=None):
+    # Parses file_path once and evaluates every model of {name: model name or
+    # (model name, options)} on its own pool worker, all reading the same
+    # memory-mapped arrays. Returns a per-model summary and the windowed
+    # accuracy/kappa/throughput records, both as DataFrames.
+    path = load_stream(file_path, cache_dir)
+    every = every or window_size
+    tasks = []
+    for name, spec in models.items():
+        model_name, options = (spec, None) if isinstance(spec, str) else spec
+        tasks.append((name, model_name, options, path, pretrain_size, max_samples, batch_size, window_size, every))
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            results = pool.map(evaluate_model, tasks)
+    else:
+        results = [evaluate_model(task) for task in tasks]
+    summary = pd.DataFrame([result[0] for result in results]).set_index('model')
+    windows = pd.DataFrame([record for result in results for record in result[1]],
+                           columns=['model', 'sample', 'accuracy', 'kappa', 'samples_per_second'])
+    return summary, windows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prequential evaluation of stream classifiers")
+    parser.add_argument('input_file', nargs='?', default='stream_data.csv')
+    parser.add_argument('--models', nargs='+', default=['hoeffding_tree', 'adaptive_random_forest'],
+                        choices=sorted(MODELS))
+    parser.add_argument('--pretrain-size', type=int, default=2000000)
+    parser.add_argument('--max-samples', type=int, default=4000000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--window-size', type=int, default=200)
+    parser.add_argument('--every', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    summary, windows = evaluate_prequential(args.input_file, {name: name for name in args.models},
+                                            args.pretrain_size, args.max_samples, args.batch_size,
+                                            args.window_size, args.every, args.workers)
+    print(summary.to_string())
+    print(windows.to_string(index=False))
@@ -0,0 +1,345 @@
+import io
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, diags
+
+from cf import Ratings, build_ratings, indicator, similarity_rows, top_predictions
+
+# Users scored together in one block, and sent to a worker as one task
+DEFAULT_CHUNK_SIZE = 256
+
+
+class LRUCache:
+    # Dict with a size bound that evicts the least recently used entry
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        value = self.entries.get(key, default)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        return self.entries.items()
+
+    def clear(self):
+        self.entries.clear()
+
+
+def read_new_ratings(file_path, offset=0):
+    # Rows of ratings.csv from byte offset on, as a DataFrame, and the offset
+    # to continue from next time. A trailing line without its newline is left
+    # for the next call, in case it is still being written.
+    with open(file_path, 'rb') as file:
+        header = file.readline()
+        if offset == 0:
+            offset = file.tell()
+        file.seek(offset)
+        data = file.read()
+    data = data[:data.rfind(b'\n') + 1]
+    names = header.decode('utf-8').strip().split(',')
+    frame = pd.read_csv(io.BytesIO(data), names=names, header=None) if data else pd.DataFrame(columns=names)
+    return frame, offset + len(data)
+
+def replace_rows(matrix, rows, new_rows):
+    # matrix with the given rows swapped for new_rows, by sparse products
+    # rather than a rebuild
+    keep = np.ones(matrix.shape[0])
+    keep[rows] = 0
+    placement = csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(matrix.shape[0], len(rows)))
+    return (diags(keep) @ matrix + placement @ new_rows).tocsr()
+
+def grow(matrix, shape):
+    matrix = matrix.tocsr(copy=True)
+    matrix.resize(shape)
+    return matrix
+
+
+class HybridRecommender:
+    # Serves the notebook's hybrid of user-user and item-item CF for many
+    # users: w_user * user-user + w_item * item-item for items in both
+    # candidate lists, w_user * user-user for items only in the user-user one.
+    #
+    # User-user scores a block of users at once from their similarity rows,
+    # which are kept in an LRU cache. Item-item similarities are dot products
+    # of normalised item rows, computed per user against the items they
+    # rated, so the items x items matrix is never stored. New ratings update
+    # the running sums behind mu and the biases, the normalised rows of the
+    # changed users and items, and the changed entries of every cached
+    # similarity row; only the result cache is dropped.
+    def __init__(self, ratings, method='pearson', num_neighbours=10, w_user=0.7, w_item=0.3,
+                 candidates=150, item_baseline=False, cache_size=256):
+        self.method = method
+        self.num_neighbours = num_neighbours
+        self.w_user = w_user
+        self.w_item = w_item
+        self.candidates = candidates
+        self.item_baseline = item_baseline
+        self.matrix = ratings.matrix.tocsr().astype(np.float64)
+        self.user_ids = ratings.user_ids.tolist()
+        self.item_ids = ratings.item_ids.tolist()
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.item_index = {item_id: column for column, item_id in enumerate(self.item_ids)}
+        self.similarity_cache = LRUCache(cache_size)
+        self.result_cache = LRUCache(cache_size)
+        self.offset = None
+        self.pool = None
+        self.pool_workers = 0
+
+        self.user_rows = similarity_rows(self.matrix, method)
+        self.item_rows = similarity_rows(self.matrix.T.tocsr(), method)
+        self.item_rows_t = self.item_rows.T.tocsr()
+        self.user_sums = np.asarray(self.matrix.sum(axis=1)).ravel()
+        self.user_counts = np.diff(self.matrix.indptr).astype(np.float64)
+        self.item_sums = np.asarray(self.matrix.sum(axis=0)).ravel()
+        self.item_counts = np.bincount(self.matrix.indices, minlength=self.matrix.shape[1]).astype(np.float64)
+
+    @staticmethod
+    def from_csv(file_path, **options):
+        # Remembers how far the file was read, for refresh()
+        frame, offset = read_new_ratings(file_path)
+        recommender = HybridRecommender(build_ratings(frame), **options)
+        recommender.offset = offset
+        return recommender
+
+    def baseline(self):
+        mu = self.user_sums.sum() / self.user_counts.sum()
+        user_means = np.divide(self.user_sums, self.user_counts, out=np.full(len(self.user_sums), mu),
+                               where=self.user_counts > 0)
+        item_means = np.divide(self.item_sums, self.item_counts, out=np.full(len(self.item_sums), mu),
+                               where=self.item_counts > 0)
+        return mu, user_means - mu, item_means - mu
+
+    def similarity_block(self, rows):
+        # Similarity rows of the given users, from the cache where possible
+        block = np.empty((len(rows), len(self.user_ids)))
+        missing = []
+        for position, row in enumerate(rows):
+            cached = self.similarity_cache.get(row)
+            if cached is None:
+                missing.append(position)
+            else:
+                block[position] = cached
+        if missing:
+            computed = (self.user_rows[rows[missing]] @ self.user_rows.T).toarray()
+            for position, values in zip(missing, computed):
+                values[rows[position]] = -np.inf
+                block[position] = values
+                self.similarity_cache.put(int(rows[position]), values.copy())
+        return block
+
+    def user_user_block(self, rows):
+        # Weighted average of each user's top neighbours' ratings, for a block
+        # of users at once
+        similarities = self.similarity_block(rows)
+        k = min(self.num_neighbours, similarities.shape[1] - 1)
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        weights = np.take_along_axis(similarities, top, axis=1)
+        weights[~np.isfinite(weights)] = 0
+        neighbour_rows = np.repeat(np.arange(len(rows)), k)
+        neighbours = csr_matrix((weights.ravel(), (neighbour_rows, top.ravel())),
+                                shape=(len(rows), len(self.user_ids)))
+        numerator = (neighbours @ self.matrix).toarray()
+        denominator = (abs(neighbours) @ indicator(self.matrix)).toarray()
+        predictions = np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=denominator > 0)
+        rated = self.matrix[rows].tocoo()
+        predictions[rated.row, rated.col] = np.nan
+        return predictions
+
+    def item_item_row(self, row, mu, user_biases, item_biases):
+        user_ratings = self.matrix[row]
+        items, values = user_ratings.indices, user_ratings.data
+        similarities = (self.item_rows[items] @ self.item_rows_t).toarray()
+        similarities[np.arange(len(items)), items] = 0
+        if self.item_baseline:
+            user_baseline = mu + user_biases[row]
+            values = values - (user_baseline + item_biases[items])
+        numerator = values @ similarities
+        denominator = np.abs(similarities).sum(axis=0)
+        if self.item_baseline:
+            predictions = user_baseline + item_biases + np.divide(
+                numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+        else:
+            predictions = np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+        predictions[items] = np.nan
+        return predictions
+
+    def candidate_mask(self, predictions):
+        # The top `candidates` finite predictions of every row
+        filled = np.where(np.isfinite(predictions), predictions, -np.inf)
+        k = min(self.candidates, filled.shape[1])
+        top = np.argpartition(-filled, k - 1, axis=1)[:, :k]
+        mask = np.zeros(filled.shape, dtype=bool)
+        np.put_along_axis(mask, top, True, axis=1)
+        return mask & np.isfinite(predictions)
+
+    def hybrid_block(self, rows, top_n):
+        user_user = self.user_user_block(rows)
+        mu, user_biases, item_biases = self.baseline()
+        item_item = np.array([self.item_item_row(row, mu, user_biases, item_biases) for row in rows])
+        in_user = self.candidate_mask(user_user)
+        in_item = self.candidate_mask(item_item)
+        combined = np.where(in_user & in_item, self.w_user * user_user + self.w_item * item_item,
+                            np.where(in_user, self.w_user * user_user, np.nan))
+        item_ids = np.asarray(self.item_ids)
+        return [top_predictions(values, item_ids, top_n) for values in combined]
+
+    def recommend_chunk(self, user_ids, top_n):
+        rows = np.array([self.user_index[user_id] for user_id in user_ids], dtype=np.int64)
+        return dict(zip(user_ids, self.hybrid_block(rows, top_n)))
+
+    def recommend_many(self, user_ids, top_n=6, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        # {user id: top_n hybrid recommendations as a Series}. Cached results
+        # are reused; the rest are scored chunk_size users at a time, on a
+        # process pool when workers > 1.
+        results = {}
+        missing = []
+        for user_id in user_ids:
+            cached = self.result_cache.get((user_id, top_n))
+            if cached is None:
+                missing.append(user_id)
+            else:
+                results[user_id] = cached
+        chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+        if workers > 1 and len(chunks) > 1:
+            scored = self.worker_pool(workers).starmap(recommend_chunk, [(chunk, top_n) for chunk in chunks])
+        else:
+            scored = [self.recommend_chunk(chunk, top_n) for chunk in chunks]
+        for chunk_results in scored:
+            for user_id, recommendations in chunk_results.items():
+                self.result_cache.put((user_id, top_n), recommendations)
+                results[user_id] = recommendations
+        return {user_id: results[user_id] for user_id in user_ids}
+
+    def recommend(self, user_id, top_n=6):
+        return self.recommend_many([user_id], top_n)[user_id]
+
+    def worker_pool(self, workers):
+        # Every worker gets a copy of the model once, when the pool starts;
+        # the pool is kept for later calls and only started again for a
+        # different number of workers or after add_ratings changed the model
+        if self.pool is None or self.pool_workers != workers:
+            self.close()
+            self.pool = Pool(workers, initializer=init_worker_recommender, initargs=(self,))
+            self.pool_workers = workers
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_users_and_items(self, user_ids, item_ids):
+        new_users = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self.user_index]
+        new_items = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in self.item_index]
+        for user_id in new_users:
+            self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        for item_id in new_items:
+            self.item_index[item_id] = len(self.item_ids)
+            self.item_ids.append(item_id)
+        if not new_users and not new_items:
+            return
+        num_users, num_items = len(self.user_ids), len(self.item_ids)
+        self.matrix = grow(self.matrix, (num_users, num_items))
+        self.user_rows = grow(self.user_rows, (num_users, num_items))
+        self.item_rows = grow(self.item_rows, (num_items, num_users))
+        self.user_sums = np.concatenate((self.user_sums, np.zeros(len(new_users))))
+        self.user_counts = np.concatenate((self.user_counts, np.zeros(len(new_users))))
+        self.item_sums = np.concatenate((self.item_sums, np.zeros(len(new_items))))
+        self.item_counts = np.concatenate((self.item_counts, np.zeros(len(new_items))))
+        if new_users:
+            # Cached similarity rows get a slot for every new user, filled in
+            # by the patch in add_ratings
+            for row, values in list(self.similarity_cache.items()):
+                self.similarity_cache.entries[row] = np.concatenate((values, np.zeros(len(new_users))))
+
+    def add_ratings(self, frame, user_column='userId', item_column='movieId', rating_column='rating'):
+        # Applies new or changed ratings; a later row for the same user and
+        # item wins
+        frame = frame.drop_duplicates([user_column, item_column], keep='last')
+        if frame.empty:
+            return
+        self.add_users_and_items(frame[user_column].tolist(), frame[item_column].tolist())
+        rows = np.array([self.user_index[user_id] for user_id in frame[user_column].tolist()], dtype=np.int64)
+        columns = np.array([self.item_index[item_id] for item_id in frame[item_column].tolist()], dtype=np.int64)
+        values = frame[rating_column].to_numpy(dtype=np.float64)
+
+        old = np.asarray(self.matrix[rows, columns]).ravel()
+        new = (old == 0).astype(np.float64)
+        np.add.at(self.user_sums, rows, values - old)
+        np.add.at(self.user_counts, rows, new)
+        np.add.at(self.item_sums, columns, values - old)
+        np.add.at(self.item_counts, columns, new)
+        self.matrix = (self.matrix + csr_matrix((values - old, (rows, columns)), shape=self.matrix.shape)).tocsr()
+
+        # Only the changed users' and items' normalised rows move, so those
+        # are the only similarity entries to patch
+        changed_users = np.unique(rows)
+        changed_items = np.unique(columns)
+        new_user_rows = similarity_rows(self.matrix[changed_users], self.method)
+        self.user_rows = replace_rows(self.user_rows, changed_users, new_user_rows)
+        new_item_rows = similarity_rows(self.matrix[:, changed_items].T.tocsr(), self.method)
+        self.item_rows = replace_rows(self.item_rows, changed_items, new_item_rows)
+        self.item_rows_t = self.item_rows.T.tocsr()
+
+        if len(self.similarity_cache):
+            patch = (new_user_rows @ self.user_rows.T).toarray()
+            for row, values in self.similarity_cache.items():
+                values[changed_users] = patch[:, row]
+                position = np.searchsorted(changed_users, row)
+                if position < len(changed_users) and changed_users[position] == row:
+                    values[:] = patch[position]
+                values[row] = -np.inf
+        self.result_cache.clear()
+        # The workers hold the old model
+        self.close()
+
+    def refresh(self, file_path):
+        # Applies the rows appended to ratings.csv since the last read
+        frame, self.offset = read_new_ratings(file_path, self.offset or 0)
+        self.add_ratings(frame)
+        return len(frame)
+
+    def ratings(self):
+        return Ratings(self.matrix, np.asarray(self.user_ids), np.asarray(self.item_ids))
+
+
+# The recommender a pool worker scores with, set once per worker
+worker_recommender = None
+
+def init_worker_recommender(recommender):
+    global worker_recommender
+    worker_recommender = recommender
+
+def recommend_chunk(user_ids, top_n):
+    return worker_recommender.recommend_chunk(user_ids, top_n)
@@ -0,0 +1,116 @@
+import csv
+
+import numpy as np
+import pandas as pd
+
+from bfr import FEATURES
+
+# Synthetic stand-ins for the course inputs. Sizes are given by the caller;
+# run.py multiplies a base size per benchmark by the scale. Popularities
+# follow a Zipf law so the frequent items, heavy customers and popular
+# movies look like the real files, and every generator is seeded.
+
+CATEGORIES = ['Clothing', 'Electronics', 'Books', 'Home', 'Beauty', 'Sports', 'Toys', 'Grocery',
+              'Garden', 'Automotive', 'Health', 'Jewelry', 'Music', 'Office', 'Pets', 'Shoes']
+
+
+def zipf_choice(rng, num_values, size, exponent=1.1):
+    # Indices in [0, num_values) with P(i) proportional to 1 / (i + 1)^exponent
+    weights = 1.0 / np.arange(1, num_values + 1) ** exponent
+    return rng.choice(num_values, size=size, p=weights / weights.sum())
+
+def purchase_records(path, num_rows, num_customers=None, seed=0):
+    # q1-1.py input: customer_id, product_category, purchase_amount
+    rng = np.random.default_rng(seed)
+    num_customers = num_customers or max(10, num_rows // 20)
+    customers = zipf_choice(rng, num_customers, num_rows, 0.8)
+    categories = zipf_choice(rng, len(CATEGORIES), num_rows, 0.6)
+    amounts = np.round(rng.gamma(2.0, 40.0, num_rows), 2)
+    frame = pd.DataFrame({
+        'customer_id': customers + 1000,
+        'product_category': np.asarray(CATEGORIES)[categories],
+        'purchase_amount': amounts,
+    })
+    frame.to_csv(path, index=False)
+    return num_rows
+
+def customer_objects(num_rows, num_customers=None, num_objects=400, seed=0):
+    # The HW2 MinHash input: customers and the names of the objects they
+    # bought, as a DataFrame
+    rng = np.random.default_rng(seed)
+    num_customers = num_customers or max(10, num_rows // 10)
+    names = np.asarray([f"{CATEGORIES[i % len(CATEGORIES)].lower()}_{i}" for i in range(num_objects)])
+    return pd.DataFrame({
+        'customer_id': zipf_choice(rng, num_customers, num_rows, 0.7),
+        'object_name': names[zipf_choice(rng, num_objects, num_rows)],
+    })
+
+def store_baskets(path, num_baskets, num_items=120, mean_size=4, num_patterns=20, seed=0):
+    # store.csv: one basket of item names per row, no header. A few planted
+    # patterns of 2-4 items turn up together often enough to be frequent.
+    rng = np.random.default_rng(seed)
+    patterns = [rng.choice(num_items, size=rng.integers(2, 5), replace=False) for _ in range(num_patterns)]
+    sizes = np.maximum(1, rng.poisson(mean_size, num_baskets))
+    drawn = np.split(zipf_choice(rng, num_items, sizes.sum()), np.cumsum(sizes)[:-1])
+    planted = rng.integers(num_patterns, size=num_baskets)
+    planted[rng.random(num_baskets) >= 0.3] = -1
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        for items, pattern in zip(drawn, planted.tolist()):
+            basket = set(items.tolist())
+            if pattern >= 0:
+                basket.update(patterns[pattern].tolist())
+            writer.writerow([f"item{item}" for item in sorted(basket)])
+    return num_baskets
+
+def verse_corpus(num_verses, vocabulary_size=5000, mean_length=5, seed=0):
+    # Preprocessed verses (token lists after normalising, stopword removal
+    # and stemming) over a Zipfian vocabulary of Persian-looking words
+    rng = np.random.default_rng(seed)
+    letters = list('ابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی')
+    vocabulary = [''.join(rng.choice(letters, size=rng.integers(2, 7))) for _ in range(vocabulary_size)]
+    lengths = rng.poisson(mean_length, num_verses)
+    tokens = np.split(zipf_choice(rng, vocabulary_size, lengths.sum()), np.cumsum(lengths)[:-1])
+    return [[vocabulary[token] for token in dict.fromkeys(verse.tolist())] for verse in tokens]
+
+def bit_stream(length, density=0.5, burst_length=1000, seed=0):
+    # 0/1 uint8 stream whose density of 1s drifts from burst to burst, so
+    # windows of different sizes see different counts
+    rng = np.random.default_rng(seed)
+    num_bursts = -(-length // burst_length)
+    densities = np.clip(rng.normal(density, 0.2, num_bursts), 0.01, 0.99)
+    probabilities = np.repeat(densities, burst_length)[:length]
+    return (rng.random(length) < probabilities).astype(np.uint8)
+
+def song_features(path, num_rows, num_clusters=15, seed=0):
+    # songs.csv: the audio features of bfr.FEATURES, drawn from Gaussian
+    # blobs with a per-feature scale like the real columns (loudness in dB,
+    # tempo in BPM, the rest in [0, 1])
+    rng = np.random.default_rng(seed)
+    scales = np.array([1, 1, 10, 0.3, 1, 0.5, 1, 40])
+    offsets = np.array([0, 0, -10, 0, 0, 0, 0, 120])
+    centres = rng.random((num_clusters, len(FEATURES))) * scales + offsets
+    labels = rng.integers(num_clusters, size=num_rows)
+    points = centres[labels] + rng.normal(0, 0.05, (num_rows, len(FEATURES))) * scales
+    frame = pd.DataFrame(points, columns=FEATURES)
+    frame.insert(0, 'track_id', np.arange(num_rows))
+    frame.to_csv(path, index=False)
+    return num_rows
+
+def movie_ratings(num_ratings, num_users=None, num_items=None, num_factors=8, seed=0):
+    # ratings.csv as a DataFrame (userId, movieId, rating): half stars from
+    # 0.5 to 5 given by low-rank user and movie factors plus noise, with
+    # Zipfian activity and popularity
+    rng = np.random.default_rng(seed)
+    num_users = num_users or max(20, num_ratings // 100)
+    num_items = num_items or max(50, num_ratings // 10)
+    users = zipf_choice(rng, num_users, num_ratings, 0.6)
+    items = zipf_choice(rng, num_items, num_ratings, 0.9)
+    frame = pd.DataFrame({'userId': users + 1, 'movieId': items + 1}).drop_duplicates()
+    user_factors = rng.normal(0, 0.5, (num_users, num_factors))
+    item_factors = rng.normal(0, 0.5, (num_items, num_factors))
+    scores = 3.5 + np.einsum('ij,ij->i', user_factors[frame['userId'].to_numpy() - 1],
+                              item_factors[frame['movieId'].to_numpy() - 1])
+    scores += rng.normal(0, 0.5, len(frame))
+    frame['rating'] = np.clip(np.round(scores * 2) / 2, 0.5, 5.0)
+    return frame.reset_index(drop=True)
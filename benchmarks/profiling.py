@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb(children=False):
+    # Peak resident set size of this process (or of its finished children)
+    # so far, in MB; None where the resource module is missing
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return usage.ru_maxrss / scale
+
+def current_rss_mb():
+    # Resident set size of this process right now, in MB; None where
+    # /proc/self/statm is missing (macOS, Windows)
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+class Profiler:
+    # Wall time and items per named stage. Stages may nest, and time is
+    # exclusive: while an inner stage runs the outer one's clock is stopped,
+    # so a pipeline of lazy generators wrapped with iterate() gets each
+    # generator's own share rather than everything it pulled through.
+    # Entering a stage again adds to its totals. A stage() also records how
+    # much resident memory it left behind (rss_delta_mb, summed over calls
+    # and including its inner stages); the process-wide peak is in report().
+    # iterate() steps are too fine-grained to read /proc for, so they don't.
+    def __init__(self):
+        self.stages = {}
+        self.stack = []
+        self.started = time.perf_counter()
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            self.charge(self.stack[-1], now)
+        self.stack.append([name, now])
+
+    def leave(self, items=None):
+        name, _ = entry = self.stack[-1]
+        now = time.perf_counter()
+        self.charge(entry, now)
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1][1] = now
+        stage = self.stages[name]
+        if items is not None:
+            stage['items'] = stage.get('items', 0) + items
+
+    def charge(self, entry, now):
+        name, since = entry
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += now - since
+        entry[1] = now
+
+    @contextmanager
+    def stage(self, name, items=None):
+        self.enter(name)
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['calls'] += 1
+        rss = current_rss_mb()
+        try:
+            yield self
+        finally:
+            self.leave(items)
+            if rss is not None:
+                stage['rss_delta_mb'] = stage.get('rss_delta_mb', 0.0) + current_rss_mb() - rss
+
+    def iterate(self, name, iterable, size=None):
+        # Yields from iterable, timing each step as stage name and counting
+        # the items, or size(item) of each with size given (len for chunks)
+        iterator = iter(iterable)
+        self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})['calls'] += 1
+        while True:
+            self.enter(name)
+            items = 0
+            try:
+                item = next(iterator)
+                items = 1 if size is None else size(item)
+            except StopIteration:
+                return
+            finally:
+                self.leave(items)
+            yield item
+
+    def count(self, name, items):
+        # Items for throughput of a stage whose size is only known afterwards
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['items'] = stage.get('items', 0) + items
+
+    def report(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            stage = dict(stage)
+            if stage.get('items') is not None:
+                stage['items_per_second'] = stage['items'] / stage['seconds'] if stage['seconds'] > 0 else None
+            stages[name] = stage
+        return {
+            'seconds': time.perf_counter() - self.started,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_child_rss_mb': peak_rss_mb(children=True),
+            'stages': stages,
+        }
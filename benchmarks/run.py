@@ -0,0 +1,130 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE_DIRS = [os.path.join(ROOT, homework, 'codes') for homework in ('HW1', 'HW2', 'HW3')]
+sys.path[1:1] = CODE_DIRS
+
+from profiling import Profiler
+from suite import BENCHMARKS
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+
+
+def run_benchmark(name, scale, workers, output_path):
+    # Runs in its own process (see measure), so peak RSS is this
+    # benchmark's alone
+    function, base_size = BENCHMARKS[name]
+    profiler = Profiler()
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as workdir:
+        facts = function(profiler, int(base_size * scale), workdir, workers)
+    result = profiler.report()
+    result.update({'benchmark': name, 'scale': scale, 'size': int(base_size * scale), 'facts': facts})
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, default=float)
+
+def measure(name, scale, workers):
+    # A fresh interpreter per benchmark and scale, whose output is dropped
+    fd, output_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--child', name, str(scale),
+                   str(workers), output_path]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output_path, encoding='utf-8') as file:
+            return json.load(file)
+    finally:
+        os.remove(output_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'], check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def append_history(path, run):
+    # Rewritten through a temporary file so an interrupted run never leaves
+    # a truncated history behind
+    history = load_history(path)
+    history.append(run)
+    parent = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(history, file, indent=1)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+def previous_result(history, name, scale):
+    for run in reversed(history):
+        for result in run['results']:
+            if result['benchmark'] == name and result['scale'] == scale:
+                return result
+    return None
+
+def print_result(result, previous=None):
+    # One line per stage; with a previous run of the same benchmark and
+    # scale, the time ratio new / old (below 1 is faster)
+    header = f"{result['benchmark']} x{result['scale']} ({result['size']} records): {result['seconds']:.2f}s, "
+    header += f"peak RSS {result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else "peak RSS n/a"
+    print(header)
+    for stage, values in result['stages'].items():
+        line = f"  {stage:<16}{values['seconds']:10.3f}s"
+        if values.get('items_per_second'):
+            line += f"{values['items_per_second']:14.0f}/s"
+        else:
+            line += ' ' * 16
+        old = previous['stages'].get(stage) if previous else None
+        if old and old['seconds'] > 0:
+            line += f"   x{values['seconds'] / old['seconds']:.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        name, scale, workers, output_path = sys.argv[2:6]
+        run_benchmark(name, float(scale), int(workers), output_path)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic inputs")
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 2, 4],
+                        help="multiples of each benchmark's base input size")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--history', default=HISTORY_PATH, help="JSON file the runs are appended to")
+    parser.add_argument('--label', help="free-form note stored with the run")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    results = []
+    for scale in args.scales:
+        for name in args.benchmarks:
+            result = measure(name, scale, args.workers)
+            print_result(result, previous_result(history, name, scale))
+            results.append(result)
+    append_history(args.history, {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'label': args.label,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+        'workers': args.workers,
+        'results': results,
+    })
@@ -0,0 +1,206 @@
+import os
+
+import numpy as np
+
+import generators
+
+# One function per pipeline. Each gets a Profiler, the number of records
+# to generate and a scratch directory, builds its input with generators,
+# then runs the pipeline through the repo's own building blocks with every
+# stage wrapped in profiler.stage() (or profiler.iterate() for the lazy
+# ones), or hands the profiler to the pipeline functions that take one and
+# report their own stages. Returns a small dict of facts about the run.
+
+
+def category_amount(row):
+    # q1-1.py part a: revenue per product category
+    return [(row[1], float(row[2]))]
+
+def bench_mapreduce(profiler, size, workdir, workers=1):
+    from mapreduce import SUM, combine_pairs, finalize_table, map_rows, read_rows, run_job
+    path = os.path.join(workdir, 'purchase_records.csv')
+    with profiler.stage('generate', size):
+        generators.purchase_records(path, size)
+    rows = profiler.iterate('read', read_rows(path))
+    pairs = profiler.iterate('map', map_rows(rows, category_amount))
+    with profiler.stage('group', size):
+        table = combine_pairs(pairs, SUM)
+    with profiler.stage('reduce', len(table)):
+        totals = finalize_table(table, SUM)
+    if workers > 1:
+        with profiler.stage('parallel', size):
+            run_job(path, category_amount, SUM, workers=workers)
+    return {'rows': size, 'keys': len(totals)}
+
+def bench_apriori(profiler, size, workdir, workers=1):
+    # q2.py: the Apriori levels, the triples and the rule scores, each
+    # reporting its stages to the profiler
+    from columnar import baskets_to_transactions, load_baskets
+    from q2 import (SupportIndex, generate_frequent_itemsets, generate_frequent_pairs, generate_frequent_triples,
+                    score_rules)
+    path = os.path.join(workdir, 'store.csv')
+    with profiler.stage('generate', size):
+        generators.store_baskets(path, size)
+    with profiler.stage('read', size):
+        transactions = baskets_to_transactions(*load_baskets(path, cache_dir=os.path.join(workdir, 'cache')))
+    min_support_items = max(2, size * 200 // 7500)
+    min_support_pairs = max(2, size * 100 // 7500)
+    min_support_triples = max(2, size * 75 // 7500)
+
+    frequent_itemsets, total_transactions, item_counts = generate_frequent_itemsets(
+        transactions, min_support_items, return_items=True, profiler=profiler)
+    frequent_pairs = generate_frequent_pairs(transactions, frequent_itemsets, min_support_pairs)
+    frequent_triples = generate_frequent_triples(transactions, frequent_pairs, min_support_triples, profiler=profiler)
+    support_index = SupportIndex(total_transactions, item_counts)
+    support_index.update(frequent_itemsets)
+    support_index.update(frequent_pairs)
+    support_index.update(frequent_triples)
+    score_rules(frequent_triples, support_index, profiler=profiler)
+    return {'baskets': size, 'itemsets': len(frequent_itemsets), 'triples': len(frequent_triples)}
+
+def bench_itemset_backends(profiler, size, workdir, workers=1):
+    # The same store.csv mined by every backend, and by SON across processes
+    from columnar import baskets_to_transactions, load_baskets
+    from eclat import VerticalIndex, eclat
+    from fpgrowth import fp_growth
+    from q2 import generate_frequent_itemsets
+    from son import son_frequent_itemsets
+    path = os.path.join(workdir, 'store.csv')
+    with profiler.stage('generate', size):
+        generators.store_baskets(path, size)
+    with profiler.stage('read', size):
+        transactions = baskets_to_transactions(*load_baskets(path, cache_dir=os.path.join(workdir, 'cache')))
+    min_support = max(2, size * 200 // 7500)
+    with profiler.stage('apriori', size):
+        found = generate_frequent_itemsets(transactions, min_support)
+    with profiler.stage('fpgrowth', size):
+        fp_growth(transactions, min_support)
+    with profiler.stage('eclat', size):
+        eclat(VerticalIndex(transactions), min_support)
+    with profiler.stage('son', size):
+        son_frequent_itemsets(path, min_support, workers=max(2, workers))
+    return {'baskets': size, 'itemsets': len(found)}
+
+def bench_verses(profiler, size, workdir, workers=1):
+    # q3.py on already preprocessed verses: apriori_and_support, reporting
+    # its stages to the profiler, then the association rules
+    from q3 import apriori_and_support, generate_association_rules
+    with profiler.stage('generate', size):
+        verses = generators.verse_corpus(size)
+    min_supports = {1: 10, 2: 8, 3: 6, 4: 4}
+    frequent_itemsets, support_counts = apriori_and_support(verses, min_supports, profiler=profiler)
+    with profiler.stage('rule-score', len(frequent_itemsets.get(2, ()))):
+        rules = generate_association_rules(frequent_itemsets, support_counts, 0.5, 'synthetic', 2)
+    return {'verses': size, 'itemsets': sum(map(len, frequent_itemsets.values())), 'rules': len(rules)}
+
+def bench_minhash_lsh(profiler, size, workdir, workers=1):
+    from lsh import LSHIndex
+    from minhash import build_minhash_func, customer_documents, minhash_signatures, shingle_matrix
+    with profiler.stage('generate', size):
+        data = generators.customer_objects(size)
+    with profiler.stage('shingle', size):
+        documents = customer_documents(data)
+        matrix, vocabulary = shingle_matrix(documents, 2)
+    with profiler.stage('minhash', len(documents)):
+        signatures = minhash_signatures(matrix, build_minhash_func(50, seed=0))
+    index = LSHIndex(10, 5)
+    keys = documents.index.tolist()
+    with profiler.stage('index', len(keys)):
+        index.insert_many(dict(zip(keys, signatures)))
+    queries = keys[:1000]
+    with profiler.stage('query', len(queries)):
+        index.query_many(queries, top_n=10)
+    return {'customers': len(keys), 'shingles': len(vocabulary)}
+
+def bench_dgim(profiler, size, workdir, workers=1):
+    from dgim import DGIM, DGIMStreams
+    with profiler.stage('generate', size):
+        bits = generators.bit_stream(size)
+    window_size = 1 << 16
+    counter = DGIM(window_size)
+    with profiler.stage('update', size):
+        for start in range(0, size, 1 << 16):
+            counter.update_many(bits[start:start + (1 << 16)])
+    windows = [window_size >> shift for shift in range(8)]
+    with profiler.stage('query', 1000 * len(windows)):
+        for _ in range(1000):
+            for k in windows:
+                counter.estimate_sum(k)
+    streams = DGIMStreams(window_size)
+    keys = [f"stream{i}" for i in range(16)]
+    per_stream = size // len(keys)
+    with profiler.stage('multi-update', per_stream * len(keys)):
+        for number, key in enumerate(keys):
+            streams.update_many(key, bits[number * per_stream:(number + 1) * per_stream])
+    with profiler.stage('multi-query', len(keys) * len(windows)):
+        for k in windows:
+            streams.estimates(k)
+    return {'bits': size, 'estimate': counter.estimate_sum(), 'bytes': streams.nbytes()}
+
+def bench_clustering(profiler, size, workdir, workers=1):
+    # songs.csv through BFR (one pass over chunks), CURE on an in-memory
+    # copy and the partitioned k-means pool backend
+    from bfr import BFR, read_chunks
+    from cure import cure_clustering
+    from distributed_kmeans import PoolBackend, partitioned_kmeans
+    path = os.path.join(workdir, 'songs.csv')
+    with profiler.stage('generate', size):
+        generators.song_features(path, size)
+    model = BFR(15)
+    chunks = []
+    for chunk in profiler.iterate('read', read_chunks(path), len):
+        with profiler.stage('bfr', len(chunk)):
+            model.fit_chunk(chunk)
+        chunks.append(chunk)
+    with profiler.stage('bfr'):
+        model.finish()
+    data = np.vstack(chunks)
+    with profiler.stage('cure', size):
+        cure_clustering(data, 15, min(size, 2000), 0.2, seed=0)
+    with profiler.stage('kmeans-load', size):
+        backend = PoolBackend(path, workers=max(2, workers))
+    with backend:
+        with profiler.stage('kmeans', size):
+            centroids, cost, iterations = partitioned_kmeans(backend, 15, max_iterations=10)
+        profiler.count('kmeans', size * (iterations - 1))
+    return {'points': size, 'kmeans_iterations': iterations}
+
+def bench_cf(profiler, size, workdir, workers=1):
+    from cf import ItemItemCF, UserUserCF, build_ratings
+    from item_index import build_item_index, user_ratings_of
+    from serving import HybridRecommender
+    with profiler.stage('generate', size):
+        frame = generators.movie_ratings(size)
+    with profiler.stage('read', len(frame)):
+        ratings = build_ratings(frame)
+    users = ratings.user_ids[:200].tolist()
+    with profiler.stage('user-user', len(users)):
+        model = UserUserCF(ratings)
+        for user_id in users:
+            model.recommend(user_id)
+    with profiler.stage('item-item', len(users)):
+        model = ItemItemCF(ratings, top_n=50)
+        for user_id in users:
+            model.recommend(user_id, baseline=True)
+    with profiler.stage('index', len(ratings.item_ids)):
+        index = build_item_index(ratings)
+    with profiler.stage('index-recommend', len(users)):
+        for user_id in users:
+            index.recommend(user_ratings_of(ratings, user_id))
+    with profiler.stage('serving', len(users)):
+        with HybridRecommender(ratings) as recommender:
+            recommender.recommend_many(users, workers=workers)
+    return {'ratings': len(frame), 'users': len(ratings.user_ids), 'items': len(ratings.item_ids)}
+
+
+# name: (function, records at scale 1)
+BENCHMARKS = {
+    'mapreduce': (bench_mapreduce, 200000),
+    'apriori': (bench_apriori, 7500),
+    'itemset_backends': (bench_itemset_backends, 7500),
+    'verses': (bench_verses, 5000),
+    'minhash_lsh': (bench_minhash_lsh, 50000),
+    'dgim': (bench_dgim, 1000000),
+    'clustering': (bench_clustering, 20000),
+    'cf': (bench_cf, 100000),
+}